@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""قياس أداء خط التحميل كاملاً دون إنترنت
+
+يرسل التحديثات عبر update_queue لتطبيق bot.py الحقيقي (معالجة متوازية كما في الإنتاج) مع:
+- مستخرج yt-dlp وهمي (yt_dlp_plugins/extractor/fake_media.py) يعيد وسائط اصطناعية
+- خادم HTTP محلي يقدم ملفات الوسائط
+- خادم Bot API وهمي يستقبل الرسائل والملفات المرفوعة
+
+الاستخدام:
+    python benchmarks/bench_e2e.py --jobs 50 --concurrency 10
+    python benchmarks/bench_e2e.py --local-mode   # خادم Bot API محلي يقرأ الملفات من القرص
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from urllib.parse import unquote, urlsplit
+
+from aiohttp import web
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# مجلد benchmarks يجب أن يسبق استيراد yt_dlp حتى تُحمل إضافة المستخرج الوهمي
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, ROOT_DIR)
+
+from stage_timer import percentile  # noqa: E402
+
+BENCH_TOKEN = '123456:BENCH'
+
+# معرفات ملفات منتهية يرفضها الخادم الوهمي كما يرفض تلقرام معرفاً لم يعد صالحاً
+STALE_FILE_ID_PREFIX = 'STALE'
+FILE_ID_ERROR = 'Bad Request: wrong file identifier/HTTP URL specified'
+STAGES = ('analyze', 'deliver', 'total', 'download', 'postprocess', 'upload')
+
+
+class FakeBotApi:
+    """خادم Bot API وهمي يعيد ردوداً صالحة ويسجل الطلبات"""
+
+    def __init__(self):
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self.calls = {}
+        self.last_message = {}
+        self.last_markup = {}
+        self.delivered = set()
+        self.media_sent = {}
+        self.last_text = {}
+        self.uploaded_bytes = 0
+        self.local_bytes = 0
+        self._changed = asyncio.Condition()
+
+    def _message(self, chat_id, **extra):
+        """رسالة تلقرام بسيطة"""
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+        }
+        message.update(extra)
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        response = await self._handle(request)
+        async with self._changed:
+            self._changed.notify_all()
+        return response
+
+    async def wait_until(self, predicate, timeout: float) -> bool:
+        """انتظار حالة في الردود المسجلة (يعيد False عند انتهاء المهلة)"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(predicate), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    @staticmethod
+    def _error(description):
+        """رد خطأ بصيغة Bot API"""
+        return web.json_response({'ok': False, 'error_code': 400, 'description': description}, status=400)
+
+    def _receive(self, value, data):
+        """قراءة ملف مرسل: رفع أو مسار محلي أو file_id (يعيد وصف الخطأ عند الرفض)"""
+        if isinstance(value, str) and value.startswith('attach://'):
+            value = data.get(value[len('attach://'):])
+        if hasattr(value, 'file'):
+            self.uploaded_bytes += len(value.file.read())
+        elif isinstance(value, str) and value.startswith('file://'):
+            # الخادم المحلي يقرأ الملف من مساره، فيجب أن يبقى موجوداً حتى انتهاء الطلب
+            local_path = unquote(urlsplit(value).path)
+            if not os.path.isfile(local_path):
+                return 'Bad Request: file not found'
+            self.local_bytes += os.path.getsize(local_path)
+        elif isinstance(value, str) and value.startswith(STALE_FILE_ID_PREFIX):
+            return FILE_ID_ERROR
+        return None
+
+    def _media_message(self, chat_id, field):
+        """رسالة وسائط مرسلة بمعرف ملف جديد"""
+        number = next(self._file_ids)
+        media = {'file_id': f'BENCH{chat_id}-{number}', 'file_unique_id': f'U{chat_id}-{number}', 'duration': 60}
+        if field == 'video':
+            media.update({'width': 1280, 'height': 720})
+        self.delivered.add(chat_id)
+        self.media_sent[chat_id] = self.media_sent.get(chat_id, 0) + 1
+        return self._message(chat_id, **{field: media})
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        data = await request.post()
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        chat_id = int(data['chat_id']) if 'chat_id' in data else None
+        if 'reply_markup' in data:
+            self.last_markup[chat_id] = json.loads(data['reply_markup'])
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'sendMessage':
+            result = self._message(chat_id, text=data.get('text', ''))
+            self.last_message[chat_id] = result['message_id']
+        elif method == 'editMessageText':
+            result = self._message(chat_id, text=data.get('text', ''))
+            result['message_id'] = int(data['message_id'])
+            self.last_text[chat_id] = result['text']
+        elif method in ('sendVideo', 'sendAudio', 'sendDocument'):
+            field = {'sendVideo': 'video', 'sendAudio': 'audio', 'sendDocument': 'document'}[method]
+            error = self._receive(data.get(field), data)
+            if error:
+                return self._error(error)
+            result = self._media_message(chat_id, field)
+        elif method == 'sendMediaGroup':
+            # عنصر واحد مرفوض يفشل الألبوم كاملاً كما في تلقرام
+            items = json.loads(data['media'])
+            for item in items:
+                error = self._receive(item['media'], data)
+                if error:
+                    return self._error(error)
+            result = [self._media_message(chat_id, item['type']) for item in items]
+        else:
+            result = True
+
+        return web.json_response({'ok': True, 'result': result})
+
+    def callback_data(self, chat_id, prefix):
+        """بيانات زر التحميل من آخر لوحة أزرار أُرسلت للمحادثة"""
+        markup = self.last_markup.get(chat_id) or {}
+        for row in markup.get('inline_keyboard', []):
+            for button in row:
+                if button.get('callback_data', '').startswith(prefix):
+                    return button['callback_data']
+        return None
+
+
+async def start_site(app):
+    """تشغيل تطبيق aiohttp على منفذ محلي عشوائي"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f'http://{host}:{port}'
+
+
+def media_app(video_size, audio_size, fragments=0, flaky=False):
+    """خادم الوسائط الاصطناعية (مع قائمة HLS اختيارية يفشل كل جزء منها مرة واحدة عند flaky)"""
+    payloads = {'mp4': os.urandom(video_size), 'm4a': os.urandom(audio_size)}
+    fragment_size = -(-video_size // fragments) if fragments else 0
+    served = set()
+    counters = {'fragment_failures': 0}
+
+    async def handle_media(request):
+        ext = request.match_info['name'].rsplit('.', 1)[-1]
+        body = payloads.get(ext)
+        if body is None:
+            return web.Response(status=404)
+        return web.Response(body=body, content_type='application/octet-stream')
+
+    async def handle_playlist(request):
+        video_id = request.match_info['video_id']
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:6', '#EXT-X-MEDIA-SEQUENCE:0']
+        for index in range(fragments):
+            lines.extend(['#EXTINF:6.0,', f'{video_id}/{index}.ts'])
+        lines.append('#EXT-X-ENDLIST')
+        return web.Response(text='\n'.join(lines) + '\n', content_type='application/vnd.apple.mpegurl')
+
+    async def handle_fragment(request):
+        key = (request.match_info['video_id'], int(request.match_info['index']))
+        if flaky and key not in served:
+            # أول طلب لكل جزء يفشل حتى يُختبر إعادة المحاولة في yt-dlp
+            served.add(key)
+            counters['fragment_failures'] += 1
+            return web.Response(status=503)
+        start = key[1] * fragment_size
+        return web.Response(body=payloads['mp4'][start:start + fragment_size], content_type='video/mp2t')
+
+    app = web.Application()
+    app.router.add_get('/media/{name}', handle_media)
+    if fragments:
+        app.router.add_get('/hls/{video_id}.m3u8', handle_playlist)
+        app.router.add_get('/hls/{video_id}/{index}.ts', handle_fragment)
+    app['counters'] = counters
+    return app
+
+
+def finished(api, chat_id, batch=0) -> bool:
+    """هل انتهى طلب المحادثة بإرسال الملف (أو برسالة النتيجة للدفعة) أو برسالة فشل"""
+    text = api.last_text.get(chat_id, '')
+    if batch:
+        return text.startswith(('✅ تم إرسال', '❌', '⚠️'))
+    return chat_id in api.delivered or text.startswith(('❌', '⚠️'))
+
+
+def job_urls(run_id, index, batch):
+    """روابط طلب مستخدم واحد (رابط واحد أو دفعة)"""
+    if batch:
+        return [f'https://www.youtube.com/bench/{run_id}-{index}-{k}' for k in range(batch)]
+    return [f'https://www.youtube.com/bench/{run_id}-{index}']
+
+
+async def run_job(application, api, index, run_id, format_type, samples, timeout, batch=0):
+    """تنفيذ طلب كامل لمستخدم واحد عبر update_queue: إرسال الرابط (أو الروابط) ثم الضغط على زر التحميل"""
+    from telegram import Update
+
+    bot = application.bot
+    user_id = chat_id = 100000 + index
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Bench'}
+    chat = {'id': chat_id, 'type': 'private'}
+    text = '\n'.join(job_urls(run_id, index, batch))
+    prefix = f"{'batch' if batch else 'download'}_{format_type}"
+
+    started = time.perf_counter()
+    await application.update_queue.put(Update.de_json({
+        'update_id': index * 2,
+        'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat, 'from': user, 'text': text},
+    }, bot))
+    await api.wait_until(lambda: api.callback_data(chat_id, prefix) is not None or finished(api, chat_id), timeout)
+    if api.callback_data(chat_id, prefix) is None:
+        return False
+    analyzed = time.perf_counter()
+
+    await application.update_queue.put(Update.de_json({
+        'update_id': index * 2 + 1,
+        'callback_query': {
+            'id': str(index),
+            'from': user,
+            'chat_instance': 'bench',
+            'data': api.callback_data(chat_id, prefix),
+            'message': {
+                'message_id': api.last_message[chat_id],
+                'date': int(time.time()),
+                'chat': chat,
+                'text': '...',
+            },
+        },
+    }, bot))
+    await api.wait_until(lambda: finished(api, chat_id, batch), timeout)
+    finished_at = time.perf_counter()
+
+    samples['analyze'].append(analyzed - started)
+    samples['deliver'].append(finished_at - analyzed)
+    samples['total'].append(finished_at - started)
+    if batch:
+        return api.media_sent.get(chat_id, 0) == batch
+    return chat_id in api.delivered
+
+
+def seed_file_ids(file_id_cache, run_id, jobs, format_type, batch, stale, valid):
+    """حفظ معرفات مسبقة لعناصر الدفعات: منتهية يرفضها الخادم ثم صالحة يجب ألا تُحذف"""
+    quality = 'audio' if format_type == 'audio' else 'best'
+    seeded = {'stale': [], 'valid': []}
+    for index in range(jobs):
+        for k in range(min(batch, stale + valid)):
+            kind = 'stale' if k < stale else 'valid'
+            # مفتاح الفيديو كما يحسبه البوت من نتيجة المستخرج الوهمي (extractor_key:id)
+            key = (f'FakeMedia:{run_id}-{index}-{k}', format_type, quality)
+            prefix = STALE_FILE_ID_PREFIX if kind == 'stale' else 'SEED'
+            file_id_cache.set(*key, f'{prefix}-{index}-{k}')
+            seeded[kind].append(key)
+    return seeded
+
+
+async def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='bench_e2e_')
+    os.environ['TELEGRAM_BOT_TOKEN'] = BENCH_TOKEN
+    os.environ.setdefault('DOWNLOAD_DIR', os.path.join(work_dir, 'downloads'))
+    os.environ.setdefault('FILE_ID_CACHE_PATH', os.path.join(work_dir, 'file_id_cache.db'))
+    os.environ.setdefault('STATS_FILE', os.path.join(work_dir, 'bot_stats.json'))
+    os.environ['BENCH_VIDEO_SIZE'] = str(args.video_size)
+    os.environ['BENCH_AUDIO_SIZE'] = str(args.audio_size)
+    os.environ['BENCH_HLS_FRAGMENTS'] = str(args.hls_fragments)
+
+    api = FakeBotApi()
+    api_app = web.Application(client_max_size=1024 ** 3)
+    api_app.router.add_post('/bot{token}/{method}', api.handle)
+    api_runner, api_url = await start_site(api_app)
+    media = media_app(args.video_size, args.audio_size, args.hls_fragments, args.flaky_fragments)
+    media_runner, media_url = await start_site(media)
+    os.environ['BENCH_MEDIA_URL'] = media_url
+    if args.local_mode:
+        # الخادم الوهمي يقوم بدور خادم Bot API المحلي (bot_api يقرأ العنوان عند الاستيراد)
+        os.environ['TELEGRAM_API_BASE_URL'] = f'{api_url}/bot'
+
+    # الاستيراد بعد تجهيز متغيرات البيئة
+    import bot as bot_module
+    from telegram.ext import ExtBot
+    from rate_limiter import OutboundRateLimiter
+    from bot_api import bot_kwargs, telegram_request
+    from stage_timer import stage_timings
+    from file_id_cache import file_id_cache
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    # محدد الطلبات ومجمع الاتصالات كما في الإنتاج (تحديثات التقدم تمرر أولوية عبر rate_limit_args)
+    if args.local_mode:
+        api_kwargs = bot_kwargs()
+    else:
+        api_kwargs = {'base_url': f'{api_url}/bot', 'base_file_url': f'{api_url}/file/bot',
+                      'request': telegram_request()}
+    bot = ExtBot(BENCH_TOKEN, rate_limiter=OutboundRateLimiter(chat_rate=args.chat_rate), **api_kwargs)
+
+    samples = {'analyze': [], 'deliver': [], 'total': []}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    run_id = f'r{int(time.time())}'
+    stage_timings.reset()
+    seeded = seed_file_ids(file_id_cache, run_id, args.jobs, args.format, args.batch,
+                           args.stale_file_ids, args.cached_file_ids)
+
+    # التطبيق نفسه الذي يشغله البوت (المعالجات والتحديثات المتوازية)
+    application = bot_module.build_application(bot)
+
+    async def limited(index):
+        async with semaphore:
+            try:
+                return await run_job(application, api, index, run_id, args.format, samples, args.timeout, args.batch)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"❌ فشلت المهمة {index}: {e}")
+                return False
+
+    try:
+        async with application:
+            await application.start()
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*[limited(i) for i in range(args.jobs)])
+            elapsed = time.perf_counter() - started
+            await application.stop()
+    finally:
+        await api_runner.cleanup()
+        await media_runner.cleanup()
+
+    for stage in ('download', 'postprocess', 'upload'):
+        samples[stage] = stage_timings.samples(stage)
+
+    return {
+        'jobs': args.jobs,
+        'concurrency': args.concurrency,
+        'format': args.format,
+        'batch': args.batch,
+        'local_mode': args.local_mode,
+        'succeeded': sum(1 for ok in outcomes if ok),
+        'elapsed': round(elapsed, 3),
+        'jobs_per_second': round(args.jobs / elapsed, 3) if elapsed else 0.0,
+        'hls_fragments': args.hls_fragments,
+        'fragment_failures': media['counters']['fragment_failures'],
+        'uploaded_bytes': api.uploaded_bytes,
+        'local_bytes': api.local_bytes,
+        'api_calls': api.calls,
+        'media_sent': sum(api.media_sent.values()),
+        'file_id_invalidations': file_id_cache.stats()['invalidations'],
+        'stale_file_ids': len(seeded['stale']),
+        # المعرفات الصالحة المحفوظة مسبقاً يجب أن تبقى بعد فشل الألبوم
+        'valid_file_ids_kept': sum(1 for key in seeded['valid'] if file_id_cache.get(*key)),
+        'valid_file_ids': len(seeded['valid']),
+        'stages': {
+            stage: {
+                'count': len(samples.get(stage, [])),
+                'p50': round(percentile(samples.get(stage, []), 50), 4),
+                'p95': round(percentile(samples.get(stage, []), 95), 4),
+                'p99': round(percentile(samples.get(stage, []), 99), 4),
+            }
+            for stage in STAGES
+        },
+    }
+
+
+def print_report(report):
+    """طباعة النتائج بشكل جدول"""
+    mode = '، خادم Bot API محلي' if report['local_mode'] else ''
+    print(f"📊 {report['jobs']} مهمة ({report['format']}{mode})، {report['concurrency']} متزامنة")
+    print(f"✅ نجح: {report['succeeded']}/{report['jobs']}  ⏱️ {report['elapsed']} ث  "
+          f"⚡ {report['jobs_per_second']} مهمة/ث")
+    print(f"{'المرحلة':<14}{'العدد':>8}{'p50 (ث)':>12}{'p95 (ث)':>12}{'p99 (ث)':>12}")
+    for stage, values in report['stages'].items():
+        if values['count']:
+            print(f"{stage:<14}{values['count']:>8}{values['p50']:>12.4f}{values['p95']:>12.4f}{values['p99']:>12.4f}")
+    print(f"📨 طلبات Bot API: {report['api_calls']}")
+    if report['batch']:
+        print(f"📦 دفعات من {report['batch']} روابط، ملفات مرسلة: {report['media_sent']}")
+    if report['stale_file_ids'] or report['valid_file_ids']:
+        print(f"♻️ معرفات محذوفة: {report['file_id_invalidations']} من {report['stale_file_ids']} منتهية، "
+              f"صالحة باقية: {report['valid_file_ids_kept']}/{report['valid_file_ids']}")
+    if report['hls_fragments']:
+        print(f"🧩 HLS: {report['hls_fragments']} أجزاء لكل فيديو، طلبات أجزاء فاشلة أُعيدت: {report['fragment_failures']}")
+    print(f"📦 مرفوع: {report['uploaded_bytes']} بايت، مقروء من القرص محلياً: {report['local_bytes']} بايت")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس أداء خط التحميل مع مستخرج وخادم Bot API وهميين')
+    parser.add_argument('--jobs', type=int, default=20, help='عدد الطلبات')
+    parser.add_argument('--concurrency', type=int, default=5, help='عدد المستخدمين المتزامنين')
+    parser.add_argument('--format', choices=('video', 'audio'), default='video',
+                        help='نوع التحميل (الصوت يحتاج ffprobe)')
+    parser.add_argument('--video-size', type=int, default=2 * 1024 * 1024, help='حجم الفيديو الاصطناعي بالبايت')
+    parser.add_argument('--audio-size', type=int, default=512 * 1024, help='حجم الصوت الاصطناعي بالبايت')
+    parser.add_argument('--chat-rate', type=float, default=None,
+                        help='حد الرسائل في الثانية لكل محادثة (افتراضي: TG_CHAT_RATE)')
+    parser.add_argument('--timeout', type=float, default=300, help='أقصى انتظار لكل مرحلة من الطلب بالثواني')
+    parser.add_argument('--batch', type=int, default=0,
+                        help='إرسال هذا العدد من الروابط في رسالة واحدة لكل مستخدم (دفعة تُرسل كألبوم)')
+    parser.add_argument('--stale-file-ids', type=int, default=0,
+                        help='عدد عناصر كل دفعة بمعرف ملف محفوظ منتهٍ يرفضه الخادم فيفشل الألبوم')
+    parser.add_argument('--cached-file-ids', type=int, default=0,
+                        help='عدد عناصر كل دفعة (بعد المنتهية) بمعرف محفوظ صالح يجب ألا يُحذف')
+    parser.add_argument('--hls-fragments', type=int, default=0,
+                        help='تقديم الفيديو كقائمة HLS بهذا العدد من الأجزاء (0: ملف واحد)')
+    parser.add_argument('--flaky-fragments', action='store_true',
+                        help='إفشال أول طلب لكل جزء HLS لاختبار إعادة المحاولة')
+    parser.add_argument('--local-mode', action='store_true',
+                        help='تشغيل البوت بوضع خادم Bot API المحلي (إرسال مسارات الملفات بدل رفعها)')
+    parser.add_argument('--json', help='حفظ النتائج في ملف JSON للمقارنة بين التشغيلات')
+    parser.add_argument('--verbose', action='store_true', help='إظهار سجلات البوت')
+    args = parser.parse_args()
+    if args.flaky_fragments and not args.hls_fragments:
+        parser.error('--flaky-fragments يحتاج --hls-fragments')
+    if (args.stale_file_ids or args.cached_file_ids) and args.batch < 2:
+        parser.error('--stale-file-ids و --cached-file-ids تحتاج --batch 2 أو أكثر')
+
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""مستخرج وهمي لقياس الأداء يعيد وسائط اصطناعية من خادم HTTP محلي
+
+يُحمل تلقائياً كإضافة yt-dlp عندما يكون مجلد benchmarks ضمن sys.path.
+"""
+
+import os
+
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class FakeMediaIE(InfoExtractor):
+    IE_NAME = 'fakemedia'
+    # النطاق من المنصات المدعومة حتى يمر الرابط بفحص البوت
+    _VALID_URL = r'https?://(?:www\.)?youtube\.com/bench/(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        base_url = os.environ['BENCH_MEDIA_URL'].rstrip('/')
+        video_size = int(os.getenv('BENCH_VIDEO_SIZE', str(2 * 1024 * 1024)))
+        audio_size = int(os.getenv('BENCH_AUDIO_SIZE', str(512 * 1024)))
+        duration = int(os.getenv('BENCH_DURATION', '60'))
+
+        video_format = {
+            'format_id': 'mp4-720p',
+            'url': f'{base_url}/media/{video_id}.mp4',
+            'ext': 'mp4',
+            'vcodec': 'avc1.4d401f',
+            'acodec': 'mp4a.40.2',
+            'height': 720,
+            'width': 1280,
+            'filesize': video_size,
+            'tbr': video_size * 8 / 1000 / duration,
+        }
+        if int(os.getenv('BENCH_HLS_FRAGMENTS', '0')):
+            # نفس الفيديو كقائمة HLS مقسمة لأجزاء تُحمل بالتوازي
+            video_format.update({
+                'format_id': 'hls-720p',
+                'url': f'{base_url}/hls/{video_id}.m3u8',
+                'protocol': 'm3u8_native',
+            })
+
+        return {
+            'id': video_id,
+            'title': f'Bench {video_id}',
+            'uploader': 'bench',
+            'duration': duration,
+            'view_count': 0,
+            'formats': [video_format, {
+                'format_id': 'm4a',
+                'url': f'{base_url}/media/{video_id}.m4a',
+                'ext': 'm4a',
+                'vcodec': 'none',
+                'acodec': 'mp4a.40.2',
+                'filesize': audio_size,
+                'abr': audio_size * 8 / 1000 / duration,
+            }],
+        }
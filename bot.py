@@ -13,15 +13,38 @@ from urllib.parse import urlparse
 from typing import Optional, Dict, Any
 from datetime import datetime
 import time
+import copy
+from contextlib import AsyncExitStack, ExitStack
 
-import yt_dlp
-import requests
+# أول استيراد محلي حتى يشمل قياس الإقلاع استيراد بقية الوحدات
+from startup import startup_timer, start_warmup
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaVideo, InputMediaAudio
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from telegram.constants import ParseMode, ChatAction
-from telegram.error import TelegramError, Conflict
+from telegram.error import TelegramError, Conflict, BadRequest
+from telegram.helpers import escape_markdown
 from dotenv import load_dotenv
 
+from worker_pool import download_pool
+from scheduler import download_scheduler, QueueFullError
+from metadata_cache import metadata_cache, canonical_video_key, info_video_key
+from file_id_cache import file_id_cache, extract_file_id
+from single_flight import download_flights
+from pending_store import PendingStore
+from progress_bus import ProgressBus
+from rate_limiter import OutboundRateLimiter, PRIORITY_LOW
+from webhook_server import BOT_MODE, run_webhook
+from cluster_queue import cluster_queue
+from format_planner import plan_format
+from bot_api import UPLOAD_LIMIT, CONCURRENT_UPDATES, configure_builder, upload_source
+from download_engine import engine_options, downloaded_file
+from workspace import workspace, WorkspaceFullError
+from postprocess import postprocess_pool, prepare_audio
+from stage_timer import stage_timings
+from ydl_pool import ydl_pool
+from stats_system import bot_stats
+from metrics import metrics, started_at as metrics_started_at, downloads_total, download_failures, active_jobs, start_metrics_server
+
 # إعداد اللوغيغ
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -38,11 +61,21 @@ BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError("لم يتم العثور على توكن البوت! تأكد من وجود ملف .env")
 
-# إعداد مجلد التحميل المؤقت
-DOWNLOAD_PATH = tempfile.mkdtemp()
+# مجلد التحميل (ثابت ومحدود الحجم ويُنظف دورياً)
+DOWNLOAD_PATH = workspace.root
+
+# أقصى عمر (بالثواني) لمعلومات الفيديو المحفوظة قبل إعادة الاستخراج عند التحميل
+INFO_REUSE_MAX_AGE = int(os.getenv('INFO_REUSE_MAX_AGE', '1800'))
+
+# مخزن الروابط المرتبطة بأزرار التحميل (محدود ومنتهي الصلاحية)
+TEMP_URLS = PendingStore()
+
+# أقصى عدد روابط تُعالج من رسالة واحدة، وعدد تحميلاتها المتزامنة
+BATCH_MAX_URLS = int(os.getenv('BATCH_MAX_URLS', '10'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '3'))
 
-# متغير لحفظ الروابط مؤقتاً
-TEMP_URLS = {}
+# أقصى عدد ملفات في ألبوم تيليجرام واحد
+MEDIA_GROUP_SIZE = 10
 
 # المنصات المدعومة
 SUPPORTED_PLATFORMS = {
@@ -57,40 +90,49 @@ SUPPORTED_PLATFORMS = {
     'vimeo.com': '🎥 فيميو'
 }
 
-async def reset_webhook():
+async def reset_webhook(bot):
     """إعادة تعيين webhook للبوت"""
     try:
-        # إنشاء جلسة HTTP
-        session = aiohttp.ClientSession()
-        
-        # حذف webhook الحالي
-        delete_url = f'https://api.telegram.org/bot{BOT_TOKEN}/deleteWebhook'
-        async with session.get(delete_url) as response:
-            result = await response.json()
-            if result.get('ok'):
-                logger.info("✅ تم حذف webhook بنجاح!")
-            else:
-                logger.warning(f"⚠️ لم يتم العثور على webhook: {result}")
-        
-        # تعطيل webhook
-        set_url = f'https://api.telegram.org/bot{BOT_TOKEN}/setWebhook?url='
-        async with session.get(set_url) as response:
-            result = await response.json()
-            if result.get('ok'):
-                logger.info("✅ تم تعطيل webhook بنجاح!")
-            else:
-                logger.error(f"❌ فشل في تعطيل webhook: {result}")
+        # عبر اتصالات Bot API الدائمة للبوت نفسه بدلاً من جلسة HTTP منفصلة
+        if await bot.delete_webhook():
+            logger.info("✅ تم حذف webhook بنجاح!")
+        else:
+            logger.error("❌ فشل في حذف webhook")
                 
     except Exception as e:
         logger.error(f"❌ خطأ في إعادة تعيين webhook: {e}")
         raise
-    finally:
-        if 'session' in locals():
-            await session.close()
+
+def _extract_info_job(url, ydl_opts):
+    """استخراج معلومات الفيديو (يعمل داخل مجمع العمال)"""
+    with ydl_pool.checkout('info', ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        # إزالة المفاتيح الخاصة لتصبح المعلومات قابلة للحفظ وإعادة المعالجة
+        return ydl.sanitize_info(info, remove_private_keys=True)
+
+def _download_job(url, profile, ydl_opts, outtmpl, format_selector=None, progress_hooks=(), info=None):
+    """تحميل الفيديو وإرجاع مسار الملف النهائي (يعمل داخل مجمع العمال)"""
+    # استيراد متأخر: yt-dlp لا يؤخر الإقلاع ويُجهز في الخلفية
+    import yt_dlp
+    
+    with ydl_pool.checkout(profile, ydl_opts, outtmpl, format_selector, progress_hooks) as ydl:
+        result = None
+        if info is not None:
+            # التحميل مباشرة من المعلومات المستخرجة مسبقاً دون استخراج جديد
+            try:
+                result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+            except yt_dlp.utils.DownloadError as e:
+                logger.warning(f"⚠️ فشل التحميل من المعلومات المحفوظة، سيتم إعادة الاستخراج: {e}")
+        if result is None:
+            result = ydl.extract_info(url, download=True)
+    
+    # المسار كما أبلغ عنه yt-dlp بعد المعالجة دون البحث في المجلد
+    return downloaded_file(result)
 
 class DownloadBot:
-    def __init__(self):
-        self.download_progress = {}
+    def __init__(self, pool=None):
+        self.pool = pool or download_pool
+        self.progress_bus = ProgressBus(self._send_progress, render=self._render_progress)
     
     def is_supported_url(self, url):
         """فحص إذا كان الرابط مدعوم"""
@@ -109,71 +151,116 @@ class DownloadBot:
     async def get_video_info(self, url):
         """الحصول على معلومات الفيديو"""
         try:
+            # البحث في الذاكرة المؤقتة بمعرف الفيديو
+            video_key = await self.pool.run(canonical_video_key, url)
+            cached = await metadata_cache.lookup(video_key)
+            if cached is not None:
+                logger.info(f"⚡ تم جلب المعلومات من الذاكرة المؤقتة: {video_key}")
+                return cached
+            
             ydl_opts = {
                 'quiet': True,
                 'no_warnings': True,
                 'extract_flat': False,
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                return {
-                    'title': info.get('title', 'بدون عنوان'),
-                    'duration': info.get('duration', 0),
-                    'uploader': info.get('uploader', 'غير معروف'),
-                    'view_count': info.get('view_count', 0),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'formats': info.get('formats', [])
-                }
+            with stage_timings.measure('analyze'):
+                info = await self.pool.run(_extract_info_job, url, ydl_opts)
+            
+            result = {
+                'title': info.get('title', 'بدون عنوان'),
+                'duration': info.get('duration', 0),
+                'uploader': info.get('uploader', 'غير معروف'),
+                'view_count': info.get('view_count', 0),
+                'thumbnail': info.get('thumbnail', ''),
+                'formats': info.get('formats', []),
+                'info': info,
+                'extracted_at': time.time()
+            }
+            
+            # حفظ المعلومات بالمفتاح المشتق من الرابط والمعرف الفعلي
+            metadata_cache.set(video_key, result)
+            real_key = info_video_key(info)
+            if real_key and real_key != video_key:
+                metadata_cache.set(real_key, result)
+            
+            return result
         except Exception as e:
             logger.error(f"خطأ في الحصول على معلومات الفيديو: {e}")
             return None
     
-    def progress_hook(self, d, chat_id, message_id, context):
-        """معالج شريط التقدم"""
+    def progress_hook(self, d, targets, context):
+        """معالج شريط التقدم (يُستدعى من خيط التحميل)"""
         if d['status'] == 'downloading':
             try:
-                percent = d.get('_percent_str', 'غير معروف')
-                speed = d.get('_speed_str', 'غير معروف')
-                
-                progress_text = f"📥 جاري التحميل... {percent}\n⚡ السرعة: {speed}"
-                
-                # تحديث الرسالة كل 5 ثوانٍ فقط لتجنب الإفراط
-                current_time = datetime.now().timestamp()
-                last_update = self.download_progress.get(f"{chat_id}_{message_id}", 0)
+                state = {
+                    'percent': d.get('_percent_str', 'غير معروف'),
+                    'speed': d.get('_speed_str', 'غير معروف'),
+                    'context': context,
+                }
                 
-                if current_time - last_update > 5:
-                    asyncio.create_task(
-                        self._safe_edit_message(context, chat_id, message_id, progress_text)
-                    )
-                    self.download_progress[f"{chat_id}_{message_id}"] = current_time
+                # نسخة من القائمة لأن المشتركين قد يتغيرون أثناء التحميل
+                for target in list(targets):
+                    self.progress_bus.publish(target, state)
                     
             except Exception as e:
                 logger.error(f"خطأ في تحديث شريط التقدم: {e}")
     
+    @staticmethod
+    def _render_progress(state):
+        """نص رسالة التقدم"""
+        return f"📥 جاري التحميل... {state['percent']}\n⚡ السرعة: {state['speed']}"
+    
+    async def _send_progress(self, target, text, state):
+        """إرسال تحديث التقدم إلى رسالة الحالة"""
+        chat_id, message_id = target
+        await self._safe_edit_message(state['context'], chat_id, message_id, text)
+    
     async def _safe_edit_message(self, context, chat_id, message_id, text):
-        """تحديث آمن للرسالة"""
+        """تحديث آمن للرسالة (أولوية منخفضة لأنها تحديثات شكلية)"""
         try:
             await context.bot.edit_message_text(
                 chat_id=chat_id,
                 message_id=message_id,
-                text=text
+                text=text,
+                rate_limit_args=PRIORITY_LOW
             )
         except Exception as e:
             logger.error(f"خطأ في تحديث الرسالة: {e}")
     
-    async def download_video(self, url, quality='best', format_type='video', chat_id=None, message_id=None, context=None):
-        """تحميل الفيديو"""
+    async def send_media(self, context, chat_id, format_type, media, quality):
+        """إرسال ملف أو file_id محفوظ وإرجاع الرسالة المرسلة"""
+        if format_type == "audio":
+            return await context.bot.send_audio(
+                chat_id=chat_id,
+                audio=media,
+                caption="🎵 تم تحميل الصوت بنجاح!"
+            )
+        return await context.bot.send_video(
+            chat_id=chat_id,
+            video=media,
+            caption=f"🎬 تم تحميل الفيديو بنجاح!\n📊 الجودة: {quality}"
+        )
+    
+    async def download_video(self, url, quality='best', format_type='video', chat_id=None, message_id=None, context=None, subscribers=None, info=None, format_selector=None):
+        """تحميل الفيديو (يعيد استخدام معلومات التحليل إن كانت حديثة)"""
+        if subscribers is None:
+            subscribers = [(chat_id, message_id)]
+        # مجلد فريد لكل مهمة حتى لا تتداخل ملفات التحميلات المتزامنة
+        output_path = workspace.create_job_dir(f"download_{chat_id}_{message_id}_")
+        file_path = None
         try:
-            output_path = os.path.join(DOWNLOAD_PATH, f"download_{chat_id}_{message_id}")
-            os.makedirs(output_path, exist_ok=True)
             
-            # إعدادات أساسية مشتركة
+            # لا يمكن تمرير معالج التقدم إلى عملية منفصلة
+            progress_hooks = []
+            if self.pool.kind == 'thread':
+                self.progress_bus.bind(asyncio.get_running_loop())
+                progress_hooks.append(lambda d: self.progress_hook(d, subscribers, context))
+            
+            # إعدادات أساسية مشتركة (ثابتة لكل ملف إعدادات حتى تُعاد نسخ YoutubeDL نفسها)
             base_opts = {
-                'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
-                'progress_hooks': [lambda d: self.progress_hook(d, chat_id, message_id, context)],
                 'quiet': True,
+                'noprogress': True,  # التقدم يصل عبر progress_hooks فقط
                 'no_warnings': True,
                 'extract_flat': False,
                 'writethumbnail': False,
@@ -182,26 +269,20 @@ class DownloadBot:
                 'no_check_certificate': True,
                 'prefer_insecure': True,
                 'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+                # صيغ HLS/DASH مسموحة وتُحمل أجزاؤها بالتوازي
+                **engine_options(),
                 'extractor_args': {
                     'youtube': {
-                        'skip': ['hls', 'dash'],
                         'player_skip': ['configs', 'webpage']
                     }
                 }
             }
             
             if format_type == 'audio':
+                # تجهيز الصوت (نسخ أو تحويل) مرحلة مستقلة في مجمع FFmpeg (انظر postprocess)
                 ydl_opts = {
                     **base_opts,
-                    'format': 'bestaudio/best',
-                    'extractaudio': True,
-                    'audioformat': 'mp3',
-                    'audioquality': '192',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }]
+                    'format': 'bestaudio[ext=m4a]/bestaudio/best',
                 }
             else:
                 # للفيديو: تحميل أعلى جودة متوفرة تلقائياً
@@ -210,26 +291,74 @@ class DownloadBot:
                     'format': 'best[ext=mp4]/best',  # أعلى جودة بصيغة mp4 أو أي صيغة متوفرة
                 }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                
-                # البحث عن الملف المحمل
-                files = list(Path(output_path).glob('*'))
-                if files:
-                    return str(files[0])
+            outtmpl = os.path.join(output_path, '%(title)s.%(ext)s')
+            with stage_timings.measure('download'):
+                file_path = await self.pool.run(
+                    _download_job, url, format_type, ydl_opts, outtmpl, format_selector, progress_hooks, info
+                )
+            return file_path
                     
         except Exception as e:
             logger.error(f"خطأ في تحميل الفيديو: {e}")
             return None
+        finally:
+            # حذف مجلد المهمة الفاشلة فوراً (الناجحة تُحذف بعد الرفع)
+            if not file_path or not os.path.exists(file_path):
+                workspace.remove(output_path)
+            # إيقاف تحديثات التقدم قبل رسائل النتيجة النهائية
+            for target in list(subscribers):
+                self.progress_bus.close(target)
+
+    async def postprocess(self, file_path, format_type, subscribers, context):
+        """مرحلة المعالجة: تجهيز الصوت في مجمع العمليات بعد تحرير مكان التحميل"""
+        if format_type != 'audio' or not file_path:
+            return file_path
         
-        return None
+        for chat_id, message_id in list(subscribers):
+            await self._safe_edit_message(context, chat_id, message_id, "🎛️ جاري تجهيز الملف الصوتي...")
+        
+        with stage_timings.measure('postprocess'):
+            return await postprocess_pool.run(prepare_audio, file_path)
 
 download_bot = DownloadBot()
 
+def _register_metrics():
+    """تصدير إحصائيات المكونات المشتركة كمقاييس"""
+    metrics.register_stats('bot_download_pool', download_bot.pool.stats, 'مجمع عمال التحميل')
+    metrics.register_stats('bot_postprocess_pool', postprocess_pool.stats, 'مجمع عمليات FFmpeg')
+    metrics.register_stats('bot_scheduler', download_scheduler.stats, 'جدولة التحميلات')
+    metrics.register_stats('bot_metadata_cache', metadata_cache.stats, 'ذاكرة معلومات الفيديو')
+    metrics.register_stats('bot_file_id_cache', file_id_cache.stats, 'فهرس معرفات الملفات')
+    metrics.register_stats('bot_flights', download_flights.stats, 'دمج التحميلات المتطابقة')
+    metrics.register_stats('bot_workspace', workspace.stats, 'مجلد التحميل')
+    metrics.register_stats('bot_progress', download_bot.progress_bus.stats, 'ناقل التقدم')
+    metrics.register_stats('bot_pending_urls', TEMP_URLS.metrics, 'الروابط المحفوظة للأزرار')
+    metrics.register_stats('bot_usage', bot_stats.stats, 'إحصائيات الاستخدام')
+    metrics.register_stats('bot_ydl_pool', ydl_pool.stats, 'مجمع نسخ YoutubeDL')
+
+_register_metrics()
+
+def _is_user_limit(error):
+    """رفض الجدولة بسبب حد طلبات مستخدم معين (لا يُنقل لمن انضم لتحميله)"""
+    return isinstance(error, QueueFullError) and error.reason == 'user'
+
+# رسائل تلقرام عند رفض معرف ملف محفوظ (انتهى أو لا يخص هذا البوت)
+FILE_ID_ERRORS = ('wrong file identifier', 'wrong remote file identifier', 'file reference')
+
+def _is_file_id_error(error):
+    """رفض تلقرام لمعرف الملف نفسه (وليس خطأ آخر في الطلب)"""
+    return isinstance(error, BadRequest) and any(text in str(error).lower() for text in FILE_ID_ERRORS)
+
+def _remove_download(file_path):
+    """حذف مجلد المهمة بعد انتهاء جميع المنتظرين"""
+    if file_path:
+        workspace.remove(os.path.dirname(file_path))
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """إرسال رسالة الترحيب"""
     try:
         user = update.effective_user
+        bot_stats.add_user(user.id)
         welcome_text = f"""
 🎯 **مرحباً بك {user.first_name} في بوت التحميل الاحترافي!**
 
@@ -351,7 +480,13 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         await update.message.reply_text("❌ لم أعثر على رابط صحيح!\nيرجى إرسال رابط فيديو من المنصات المدعومة.")
         return
     
-    url = urls[0]
+    # الروابط المدعومة دون تكرار، وعدة روابط تُعالج كدفعة واحدة
+    supported = list(dict.fromkeys(u for u in urls if download_bot.is_supported_url(u)))
+    if len(supported) > 1:
+        await handle_batch(update, context, supported[:BATCH_MAX_URLS])
+        return
+    
+    url = supported[0] if supported else urls[0]
     
     if not download_bot.is_supported_url(url):
         platform_list = "\n".join([f"• {name}" for name in SUPPORTED_PLATFORMS.values()])
@@ -378,9 +513,18 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     duration_str = f"{info['duration']//60}:{info['duration']%60:02d}" if info['duration'] else "غير معروف"
     views_str = f"{info['view_count']:,}" if info['view_count'] else "غير معروف"
     
+    # تقدير حجم الفيديو قبل التحميل
+    video_plan = plan_format(info, 'video', UPLOAD_LIMIT)
+    if video_plan['fits'] is False:
+        size_str = f"⚠️ أكبر من {UPLOAD_LIMIT // (1024 * 1024)} ميجا (جرب الصوت فقط)"
+    elif video_plan['estimated_size']:
+        size_str = f"{video_plan['estimated_size'] / 1024 / 1024:.1f} ميجا تقريباً"
+    else:
+        size_str = "غير معروف"
+    
     # إنشاء معرف قصير للرابط
     url_hash = hashlib.sha256(url.encode()).hexdigest()[:8]
-    TEMP_URLS[url_hash] = url
+    TEMP_URLS.put(url_hash, url)
     logger.info(f"💾 تم حفظ الرابط: {url_hash} -> {url}")
     logger.info(f"📊 إجمالي الروابط المحفوظة: {len(TEMP_URLS)}")
     
@@ -392,6 +536,7 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 👤 **المنشئ:** {info['uploader']}
 ⏱️ **المدة:** {duration_str}
 👁️ **المشاهدات:** {views_str}
+📦 **الحجم المتوقع:** {size_str}
 
 🎯 **اختر نوع التحميل:**
 • **🎬 فيديو بأعلى جودة:** سيتم تحميل أعلى جودة متوفرة تلقائياً
@@ -412,6 +557,532 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     
     await analyzing_msg.edit_text(info_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
+async def handle_batch(update: Update, context: ContextTypes.DEFAULT_TYPE, urls) -> None:
+    """تحليل عدة روابط بالتوازي وعرض خيارات تحميلها دفعة واحدة"""
+    await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+    analyzing_msg = await update.message.reply_text(f"🔍 جاري تحليل {len(urls)} روابط...")
+    
+    # التحليل بالتوازي: زمن الدفعة يساوي زمن أبطأ رابط
+    infos = await asyncio.gather(*(download_bot.get_video_info(url) for url in urls))
+    items = [(url, info) for url, info in zip(urls, infos) if info]
+    
+    if not items:
+        await analyzing_msg.edit_text("❌ فشل في تحليل جميع الروابط!\nتأكد من صحة الروابط وحاول مرة أخرى.")
+        return
+    
+    lines = []
+    for index, (url, info) in enumerate(items, start=1):
+        plan = plan_format(info, 'video', UPLOAD_LIMIT)
+        size_str = "⚠️ كبير" if plan['fits'] is False else (
+            f"{plan['estimated_size'] / 1024 / 1024:.1f} ميجا" if plan['estimated_size'] else "؟"
+        )
+        title = escape_markdown(info['title'][:40])
+        lines.append(f"{index}. {download_bot.get_platform_name(url)} {title} ({size_str})")
+    
+    failed_str = f"\n⚠️ تعذر تحليل {len(urls) - len(items)} روابط" if len(items) < len(urls) else ""
+    
+    # حفظ روابط الدفعة تحت معرف قصير واحد
+    batch_urls = '\n'.join(url for url, _ in items)
+    batch_hash = hashlib.sha256(batch_urls.encode()).hexdigest()[:8]
+    TEMP_URLS.put(batch_hash, batch_urls)
+    logger.info(f"💾 تم حفظ دفعة من {len(items)} روابط: {batch_hash}")
+    
+    info_text = f"""
+📦 **{len(items)} روابط جاهزة للتحميل**
+
+{chr(10).join(lines)}
+{failed_str}
+🎯 **اختر نوع التحميل للجميع:**
+ستصلك الملفات في ألبومات بعد تحميلها بالتوازي
+    """
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("🎬 فيديو للجميع", callback_data=f"batch_video_{batch_hash}"),
+            InlineKeyboardButton("🎵 صوت للجميع", callback_data=f"batch_audio_{batch_hash}")
+        ],
+        [
+            InlineKeyboardButton("❌ إلغاء", callback_data="cancel")
+        ]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await analyzing_msg.edit_text(info_text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+
+async def _prepare_download(url, format_type):
+    """مفتاح الفيديو ومعلوماته الحديثة وخطة صيغة تناسب حد الرفع قبل تحميل أي بايت"""
+    video_key = await download_bot.pool.run(canonical_video_key, url)
+    
+    # معلومات التحليل السابقة لتجنب استخراج ثانٍ عند التحميل
+    cached_info = await metadata_cache.lookup(video_key)
+    info = None
+    if cached_info:
+        # المفتاح الفعلي من المستخرج الذي طابق الرابط (يوحد روابط المشاركة المختلفة للفيديو نفسه)
+        video_key = info_video_key(cached_info.get('info') or {}) or video_key
+        if time.time() - cached_info.get('extracted_at', 0) < INFO_REUSE_MAX_AGE:
+            info = cached_info.get('info')
+    
+    plan = plan_format(cached_info, format_type, UPLOAD_LIMIT) if cached_info else None
+    return video_key, info, plan
+
+def _download_runner(context, chat_id, message_id, user_id, url, format_type, quality, info,
+                     format_selector, expected_size, on_position=None, running_limit=None, queue_limit=None):
+    """مهمة التحميل المشتركة: مكان في الجدولة ثم مساحة في مجلد التحميل ثم المعالجة"""
+    async def download_with_space(flight):
+        # انتظار توفر مساحة كافية للحجم المتوقع قبل بدء التحميل
+        async with workspace.admit(expected_size):
+            return await download_bot.download_video(
+                url=url,
+                quality=quality,
+                format_type=format_type,
+                chat_id=chat_id,
+                message_id=message_id,
+                context=context,
+                subscribers=flight.subscribers,
+                info=info,
+                format_selector=format_selector
+            )
+    
+    async def run_download(flight):
+        file_path = await download_scheduler.submit(
+            user_id,
+            lambda: download_with_space(flight),
+            on_position=on_position,
+            running_limit=running_limit,
+            queue_limit=queue_limit
+        )
+        
+        # المعالجة خارج مكان التحميل حتى تستمر التحميلات أثناء التحويل
+        try:
+            return await download_bot.postprocess(file_path, format_type, flight.subscribers, context)
+        except Exception:
+            _remove_download(file_path)
+            raise
+    
+    return run_download
+
+async def process_download(context, chat_id, message_id, user_id, url, format_type, quality):
+    """تنفيذ طلب تحميل كامل وتحديث رسالة الحالة (يعيد سبب الفشل أو None، ويُستخدم في البوت وفي عمال التحميل)"""
+    active_jobs.inc()
+    try:
+        with stage_timings.measure('request'):
+            return await _process_download(context, chat_id, message_id, user_id, url, format_type, quality)
+    finally:
+        active_jobs.dec()
+
+async def _process_download(context, chat_id, message_id, user_id, url, format_type, quality):
+    """خطوات طلب التحميل (يعيد سبب الفشل بعد إبلاغ المستخدم)"""
+    async def edit_status(text):
+        await context.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+    
+    video_key, info, plan = await _prepare_download(url, format_type)
+    
+    format_selector = None
+    expected_size = None
+    if plan:
+        if plan['fits'] is False:
+            download_failures.inc(reason='too_large')
+            await edit_status(
+                f"❌ الملف كبير جداً (حوالي {plan['estimated_size'] / 1024 / 1024:.0f} ميجا)!\n"
+                f"الحد الأقصى {UPLOAD_LIMIT // (1024 * 1024)} ميجا، جرب الصوت فقط."
+            )
+            return 'too_large'
+        format_selector = plan['format']
+        expected_size = plan['estimated_size']
+    
+    # إعادة إرسال الملف مباشرة إذا سبق رفعه
+    cached_file_id = await file_id_cache.lookup(video_key, format_type, quality)
+    if cached_file_id:
+        try:
+            await download_bot.send_media(context, chat_id, format_type, cached_file_id, quality)
+            await edit_status("✅ تم الإرسال بنجاح!")
+            downloads_total.inc(format=format_type, source='file_id_cache')
+            logger.info(f"⚡ تم الإرسال من فهرس الملفات: {video_key}")
+            return
+        except BadRequest as e:
+            if not _is_file_id_error(e):
+                raise
+            logger.warning(f"⚠️ معرف ملف غير صالح، سيتم التحميل من جديد: {e}")
+            file_id_cache.invalidate(video_key, format_type, quality)
+    
+    # بدء التحميل
+    await edit_status("📥 جاري بدء التحميل...")
+    
+    async def report_position(position):
+        await download_bot._safe_edit_message(
+            context, chat_id, message_id,
+            f"⏳ طلبك في قائمة الانتظار...\n📍 ترتيبك: {position}"
+        )
+    
+    run_download = _download_runner(
+        context, chat_id, message_id, user_id, url, format_type, quality,
+        info, format_selector, expected_size, on_position=report_position
+    )
+    
+    try:
+        # الطلبات المتطابقة المتزامنة تشترك في تحميل واحد
+        async with download_flights.join(
+            (video_key, format_type, quality),
+            run_download,
+            subscriber=(chat_id, message_id),
+            cleanup=_remove_download,
+            owner=user_id,
+            owner_error=_is_user_limit
+        ) as flight:
+            file_path = flight.result
+            
+            if file_path and os.path.exists(file_path):
+                file_size = os.path.getsize(file_path)
+                
+                # فحص حجم الملف (قد يختلف عن الحجم المتوقع)
+                if file_size > UPLOAD_LIMIT:
+                    download_failures.inc(reason='too_large')
+                    await edit_status(
+                        f"❌ الملف كبير جداً (أكثر من {UPLOAD_LIMIT // (1024 * 1024)} ميجا)!\n"
+                        "جرب جودة أقل أو اختر الصوت فقط."
+                    )
+                    return 'too_large'
+                
+                await edit_status("📤 جاري رفع الملف...")
+                
+                # رفع الملف مرة واحدة ثم إرسال file_id لبقية المنتظرين
+                async with flight.lock:
+                    shared_file_id = flight.shared.get('file_id')
+                    if shared_file_id:
+                        await download_bot.send_media(context, chat_id, format_type, shared_file_id, quality)
+                        source = 'shared'
+                    else:
+                        # إرسال الملف (بالمسار مباشرة عند استخدام خادم Bot API محلي)
+                        with stage_timings.measure('upload'), upload_source(file_path) as file:
+                            sent = await download_bot.send_media(context, chat_id, format_type, file, quality)
+                        
+                        # حفظ file_id لإعادة استخدامه في الطلبات القادمة
+                        sent_file_id = extract_file_id(sent)
+                        if sent_file_id:
+                            flight.shared['file_id'] = sent_file_id
+                            file_id_cache.set(video_key, format_type, quality, sent_file_id)
+                        source = 'upload'
+                
+                await edit_status("✅ تم التحميل والإرسال بنجاح!")
+                downloads_total.inc(format=format_type, source=source)
+                logger.info(f"⏱️ أزمنة المراحل: {stage_timings.stats()}")
+                    
+            else:
+                download_failures.inc(reason='no_file')
+                await edit_status(
+                    "❌ فشل في التحميل!\n"
+                    "الأسباب المحتملة:\n"
+                    "• المحتوى محمي أو خاص\n"
+                    "• الرابط منتهي الصلاحية\n"
+                    "• مشكلة في الاتصال\n"
+                    "• المنصة غير مدعومة حالياً\n\n"
+                    "جرب رابط آخر أو تأكد من صحة الرابط."
+                )
+                return 'no_file'
+    
+    except WorkspaceFullError:
+        download_failures.inc(reason='workspace_full')
+        await edit_status(
+            "⚠️ مساحة التخزين ممتلئة حالياً!\n"
+            "يرجى المحاولة بعد قليل."
+        )
+        return 'workspace_full'
+    
+    except QueueFullError as e:
+        download_failures.inc(reason=f'queue_full_{e.reason}')
+        if e.reason == 'user':
+            await edit_status(
+                "⚠️ لديك طلبات كثيرة قيد الانتظار!\n"
+                "انتظر حتى تنتهي تحميلاتك الحالية ثم حاول مرة أخرى."
+            )
+        else:
+            await edit_status(
+                "⚠️ البوت مشغول جداً حالياً!\n"
+                "يرجى المحاولة بعد قليل."
+            )
+        return f'queue_full_{e.reason}'
+            
+    except Exception as e:
+        logger.error(f"خطأ في التحميل: {e}")
+        error_msg = "❌ حدث خطأ أثناء التحميل!\n"
+        
+        # إضافة تفاصيل الخطأ للمطورين
+        if "HTTP Error 403" in str(e):
+            reason = 'forbidden'
+            error_msg += "السبب: المحتوى محمي أو غير متاح"
+        elif "Video unavailable" in str(e):
+            reason = 'unavailable'
+            error_msg += "السبب: الفيديو غير متاح أو محذوف"
+        elif "Private video" in str(e):
+            reason = 'private'
+            error_msg += "السبب: الفيديو خاص"
+        elif "This video is not available" in str(e):
+            reason = 'geo_blocked'
+            error_msg += "السبب: الفيديو غير متاح في منطقتك"
+        else:
+            reason = 'error'
+            error_msg += "حاول مرة أخرى أو جرب رابط آخر"
+        
+        download_failures.inc(reason=reason)
+        await edit_status(error_msg)
+        return f"{reason}: {e}"
+
+async def process_batch(context, chat_id, message_id, user_id, urls, format_type):
+    """تحميل عدة روابط بالتوازي عبر خط التحميل وإرسالها في ألبومات"""
+    active_jobs.inc()
+    try:
+        with stage_timings.measure('batch'):
+            await _process_batch(context, chat_id, message_id, user_id, urls, format_type)
+    finally:
+        active_jobs.dec()
+
+async def _fetch_batch_item(stack, context, chat_id, message_id, user_id, url, format_type, quality):
+    """تجهيز عنصر من الدفعة: file_id محفوظ أو ملف محمل يبقى حتى إرسال الألبوم"""
+    video_key, info, plan = await _prepare_download(url, format_type)
+    if plan and plan['fits'] is False:
+        download_failures.inc(reason='too_large')
+        return None
+    
+    item = {'url': url, 'video_key': video_key, 'file_id': await file_id_cache.lookup(video_key, format_type, quality), 'path': None, 'flight': None}
+    if item['file_id']:
+        item['source'] = 'file_id_cache'
+        return item
+    
+    run_download = _download_runner(
+        context, chat_id, message_id, user_id, url, format_type, quality, info,
+        plan['format'] if plan else None, plan['estimated_size'] if plan else None,
+        running_limit=BATCH_CONCURRENCY, queue_limit=BATCH_MAX_URLS
+    )
+    # المشاركة في تحميل جارٍ لنفس الفيديو، والملف يبقى حتى خروج الدفعة من stack
+    flight = await stack.enter_async_context(download_flights.join(
+        (video_key, format_type, quality),
+        run_download,
+        cleanup=_remove_download,
+        owner=user_id,
+        owner_error=_is_user_limit
+    ))
+    item['flight'] = flight
+    
+    shared_file_id = flight.shared.get('file_id')
+    if shared_file_id:
+        item['file_id'] = shared_file_id
+        item['source'] = 'shared'
+        return item
+    
+    file_path = flight.result
+    if not file_path or not os.path.exists(file_path):
+        download_failures.inc(reason='no_file')
+        return None
+    if os.path.getsize(file_path) > UPLOAD_LIMIT:
+        download_failures.inc(reason='too_large')
+        return None
+    item['path'] = file_path
+    item['source'] = 'upload'
+    return item
+
+async def _send_media_items(context, chat_id, format_type, quality, items):
+    """إرسال العناصر كألبوم (أو كرسالة عادية لعنصر واحد) وإرجاع الرسائل المرسلة"""
+    if len(items) == 1:
+        # الألبوم يتطلب ملفين على الأقل
+        item = items[0]
+        if item['file_id']:
+            return [await download_bot.send_media(context, chat_id, format_type, item['file_id'], quality)]
+        with upload_source(item['path']) as file:
+            return [await download_bot.send_media(context, chat_id, format_type, file, quality)]
+    
+    media_class = InputMediaAudio if format_type == 'audio' else InputMediaVideo
+    if format_type == 'audio':
+        caption = f"🎵 تم تحميل {len(items)} ملفات صوتية بنجاح!"
+    else:
+        caption = f"🎬 تم تحميل {len(items)} فيديوهات بنجاح!\n📊 الجودة: {quality}"
+    with ExitStack() as files:
+        media = [
+            media_class(
+                media=item['file_id'] or files.enter_context(upload_source(item['path'])),
+                caption=caption if index == 0 else None
+            )
+            for index, item in enumerate(items)
+        ]
+        return await context.bot.send_media_group(chat_id=chat_id, media=media)
+
+async def _send_album(context, chat_id, format_type, quality, items):
+    """إرسال عناصر الدفعة في ألبوم واحد وحفظ معرفات الملفات المرفوعة (يعيد عدد المرسل)"""
+    flights = {id(item['flight']): item['flight'] for item in items if item['path']}
+    async with AsyncExitStack() as locks:
+        # رفع كل ملف مرة واحدة حتى لو شاركت الدفعة تحميله مع طلب آخر
+        # (ترتيب ثابت للأقفال حتى لا تتعارض دفعتان تشتركان في عدة تحميلات)
+        for flight in sorted(flights.values(), key=lambda flight: repr(flight.key)):
+            await locks.enter_async_context(flight.lock)
+        for item in items:
+            shared_file_id = item['path'] and item['flight'].shared.get('file_id')
+            if shared_file_id:
+                item.update(file_id=shared_file_id, path=None, source='shared')
+        
+        sent = await _send_media_items(context, chat_id, format_type, quality, items)
+        
+        for item, message in zip(items, sent):
+            downloads_total.inc(format=format_type, source=item['source'])
+            sent_file_id = extract_file_id(message)
+            if item['path'] and sent_file_id:
+                item['flight'].shared['file_id'] = sent_file_id
+                file_id_cache.set(item['video_key'], format_type, quality, sent_file_id)
+    return len(sent)
+
+async def _process_batch(context, chat_id, message_id, user_id, urls, format_type):
+    """خطوات طلب الدفعة"""
+    quality = 'audio' if format_type == 'audio' else 'best'
+    
+    async def edit_status(text):
+        await download_bot._safe_edit_message(context, chat_id, message_id, text)
+    
+    async def resend_separately(album):
+        # كل عنصر يُرسل وحده، والمعرف المحفوظ لا يُحذف إلا إذا رفضه تلقرام تحديداً
+        sent = 0
+        stale = []
+        for item in album:
+            try:
+                sent += await _send_album(context, chat_id, format_type, quality, [item])
+            except Exception as e:
+                if item['source'] == 'file_id_cache' and _is_file_id_error(e):
+                    logger.warning(f"⚠️ معرف ملف غير صالح، سيتم التحميل من جديد: {e}")
+                    file_id_cache.invalidate(item['video_key'], format_type, quality)
+                    stale.append(item)
+                else:
+                    logger.error(f"خطأ في إرسال عنصر من الدفعة: {e}")
+                    download_failures.inc(reason='error')
+        
+        # المعرفات المرفوضة تُحمل من جديد بالتوازي كما في الطلب الفردي
+        refetched = await asyncio.gather(
+            *(_fetch_batch_item(stack, context, chat_id, message_id, user_id, item['url'], format_type, quality) for item in stale),
+            return_exceptions=True
+        )
+        for item in refetched:
+            if item is None:
+                continue
+            try:
+                if isinstance(item, BaseException):
+                    raise item
+                sent += await _send_album(context, chat_id, format_type, quality, [item])
+            except Exception as e:
+                logger.error(f"خطأ في إرسال عنصر من الدفعة: {e}")
+                download_failures.inc(reason='error')
+        return sent
+    
+    await edit_status(f"📥 جاري تحميل {len(urls)} ملفات بالتوازي...")
+    
+    async with AsyncExitStack() as stack:
+        # جميع العناصر تمر عبر الجدولة ومجلد التحميل نفسها بالتوازي
+        results = await asyncio.gather(
+            *(_fetch_batch_item(stack, context, chat_id, message_id, user_id, url, format_type, quality) for url in urls),
+            return_exceptions=True
+        )
+        
+        items = []
+        keys = set()
+        duplicates = 0
+        for url, result in zip(urls, results):
+            if isinstance(result, WorkspaceFullError):
+                download_failures.inc(reason='workspace_full')
+            elif isinstance(result, QueueFullError):
+                download_failures.inc(reason=f'queue_full_{result.reason}')
+            elif isinstance(result, BaseException):
+                logger.error(f"خطأ في تحميل عنصر من الدفعة {url}: {result}")
+                download_failures.inc(reason='error')
+            elif result is not None and result['video_key'] in keys:
+                # روابط مختلفة للفيديو نفسه تُرسل مرة واحدة
+                duplicates += 1
+            elif result is not None:
+                keys.add(result['video_key'])
+                items.append(result)
+        
+        if not items:
+            await edit_status("❌ فشل تحميل جميع الروابط!\nجرب روابط أخرى أو تأكد من صحتها.")
+            return
+        
+        await edit_status(f"📤 جاري رفع {len(items)} ملفات...")
+        
+        delivered = 0
+        with stage_timings.measure('upload'):
+            for start in range(0, len(items), MEDIA_GROUP_SIZE):
+                album = items[start:start + MEDIA_GROUP_SIZE]
+                try:
+                    delivered += await _send_album(context, chat_id, format_type, quality, album)
+                except TelegramError as e:
+                    # عنصر واحد (مثل معرف محفوظ منتهي) يفشل الألبوم كاملاً
+                    logger.warning(f"⚠️ فشل إرسال الألبوم، إعادة المحاولة لكل ملف على حدة: {e}")
+                    delivered += await resend_separately(album)
+    
+    # الروابط المكررة لنفس الفيديو لا تُحسب مرسلة ولا فاشلة
+    requested = len(urls) - duplicates
+    failed = requested - delivered
+    status = f"✅ تم إرسال {delivered} من {requested} ملفات بنجاح!"
+    if duplicates:
+        status += f"\n🔁 تم تجاهل {duplicates} روابط مكررة لنفس الفيديو"
+    if failed:
+        status += f"\n⚠️ تعذر تحميل {failed} روابط"
+    await edit_status(status)
+    logger.info(f"⏱️ أزمنة المراحل: {stage_timings.stats()}")
+
+STAGE_LABELS = (
+    ('analyze', '🔍 التحليل'),
+    ('download', '📥 التحميل'),
+    ('postprocess', '🎛️ المعالجة'),
+    ('upload', '📤 الرفع'),
+    ('request', '🔄 الطلب كاملاً'),
+    ('batch', '📦 الدفعة كاملة'),
+)
+
+def _render_live_stats():
+    """نص شاشة الإحصائيات من المقاييس الحية"""
+    uptime = int(time.time() - metrics_started_at)
+    completed = downloads_total.values()
+    failures = download_failures.values()
+    succeeded = sum(completed.values())
+    failed = sum(failures.values())
+    total = succeeded + failed
+    by_format = {}
+    for (format_type, _source), count in completed.items():
+        by_format[format_type] = by_format.get(format_type, 0) + count
+    
+    scheduler = download_scheduler.stats()
+    timings = stage_timings.stats()
+    stage_lines = [
+        f"┣ {label}: {timings[stage]['p50']} / {timings[stage]['p95']} ث"
+        for stage, label in STAGE_LABELS if stage in timings
+    ] or ["┣ لا توجد قياسات بعد"]
+    stage_lines[-1] = '┗' + stage_lines[-1][1:]
+    
+    # الشرطة السفلية تكسر تنسيق Markdown
+    top_failure = max(failures.items(), key=lambda item: item[1])[0][0].replace('_', ' ') if failures else 'لا يوجد'
+    space = workspace.stats()
+    usage = bot_stats.stats()
+    
+    return f"""
+📊 **إحصائيات مفصلة (مباشرة)**
+
+━━━━━━━━━━━━━━━━━━━━━
+
+📈 **أداء البوت:**
+┣ ⏱️ **مدة التشغيل:** {uptime // 3600} ساعة {uptime % 3600 // 60} دقيقة
+┣ 👥 **المستخدمين:** {usage['total_users']:,} (تحميلات اليوم: {usage['today_downloads']:,})
+┣ ✅ **تحميلات ناجحة:** {succeeded:,} (فيديو {by_format.get('video', 0):,} / صوت {by_format.get('audio', 0):,})
+┣ ❌ **تحميلات فاشلة:** {failed:,} (الأكثر: {top_failure})
+┣ 🎯 **معدل النجاح:** {succeeded / total * 100 if total else 100:.1f}%
+┗ 🔄 **قيد التنفيذ:** {int(active_jobs.values().get((), 0))} (في الانتظار: {scheduler['queued']})
+
+━━━━━━━━━━━━━━━━━━━━━
+
+⏱️ **أزمنة المراحل (p50 / p95):**
+{chr(10).join(stage_lines)}
+
+━━━━━━━━━━━━━━━━━━━━━
+
+⚡ **الذاكرة المؤقتة:**
+┣ 🔍 **معلومات الفيديو:** {metadata_cache.stats()['hit_rate'] * 100:.0f}% إصابة
+┣ 📁 **معرفات الملفات:** {file_id_cache.stats()['hit_rate'] * 100:.0f}% إصابة
+┗ 💾 **مجلد التحميل:** {space['usage'] / 1024 / 1024:.0f} / {space['quota'] / 1024 / 1024:.0f} ميجا
+    """
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """معالجة النقر على الأزرار"""
     query = update.callback_query
@@ -560,34 +1231,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return
     elif query.data == "stats":
-        stats_text = """
-📊 **إحصائيات مفصلة**
-
-━━━━━━━━━━━━━━━━━━━━━
-
-📈 **أداء البوت:**
-┣ ⚡ **وقت الاستجابة:** < 0.5 ثانية
-┣ 🎯 **معدل النجاح:** 98.5%
-┣ 📥 **التحميلات اليوم:** 1,247
-┣ 👥 **المستخدمين النشطين:** 892
-┗ 🌍 **الدول المدعومة:** 195
-
-━━━━━━━━━━━━━━━━━━━━━
-
-🏆 **أرقام قياسية:**
-┣ 📁 **أكبر ملف:** 49.8 ميجا
-┣ ⏱️ **أسرع تحميل:** 2.3 ثانية
-┣ 🎵 **أشهر صيغة:** MP3
-┗ 🎬 **أشهر جودة:** 720p
-
-━━━━━━━━━━━━━━━━━━━━━
-
-🌐 **توزيع المنصات:**
-┣ 🎬 يوتيوب: 65%
-┣ 🎵 تيك توك: 20%
-┣ 📸 انستاغرام: 10%
-┗ 🔄 أخرى: 5%
-        """
+        stats_text = _render_live_stats()
         
         keyboard = [
             [InlineKeyboardButton("🔙 العودة", callback_data="about")]
@@ -642,6 +1286,48 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return
     # معالجة طلبات التحميل
+    if query.data.startswith("batch_"):
+        # batch_video_hash أو batch_audio_hash
+        parts = query.data.split("_", 2)
+        if len(parts) < 3:
+            await query.edit_message_text("❌ خطأ في البيانات!")
+            return
+        format_type = parts[1]
+        
+        stored = await TEMP_URLS.get(parts[2])
+        if not stored:
+            await query.edit_message_text(
+                "❌ انتهت صلاحية الروابط!\n"
+                "الرجاء إرسال الروابط مرة أخرى."
+            )
+            return
+        
+        urls = stored.split('\n')
+        bot_stats.add_user(query.from_user.id)
+        for _ in urls:
+            bot_stats.add_download(format_type)
+        
+        chat_id = query.message.chat.id
+        quality = 'audio' if format_type == 'audio' else 'best'
+        
+        # في وضع العنقود يُرسل كل رابط كمهمة مستقلة برسالة حالة خاصة به
+        if cluster_queue is not None:
+            await query.edit_message_text(f"⏳ تمت إضافة {len(urls)} طلبات إلى قائمة التحميل...")
+            for url in urls:
+                status_msg = await context.bot.send_message(chat_id=chat_id, text="⏳ في قائمة التحميل...")
+                await cluster_queue.run(cluster_queue.enqueue, {
+                    'chat_id': chat_id,
+                    'message_id': status_msg.message_id,
+                    'user_id': query.from_user.id,
+                    'url': url,
+                    'format_type': format_type,
+                    'quality': quality,
+                })
+            return
+        
+        await process_batch(context, chat_id, query.message.message_id, query.from_user.id, urls, format_type)
+        return
+    
     if query.data.startswith("download_"):
         logger.info(f"🔍 معالجة طلب تحميل: {query.data}")
         
@@ -675,13 +1361,13 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             url_hash = parts[2]
         
         logger.info(f"🎯 الجودة: {quality}, معرف الرابط: {url_hash}")
-        logger.info(f"💾 TEMP_URLS الحالية: {list(TEMP_URLS.keys())}")
+        logger.info(f"💾 TEMP_URLS الحالية: {TEMP_URLS.metrics()}")
         
         # استعادة الرابط من قاعدة البيانات المؤقتة
-        url = TEMP_URLS.get(url_hash)
+        url = await TEMP_URLS.get(url_hash)
         if not url:
             logger.error(f"❌ لم يتم العثور على الرابط بالمعرف: {url_hash}")
-            logger.error(f"💾 TEMP_URLS المتاحة: {TEMP_URLS}")
+            logger.error(f"💾 TEMP_URLS المتاحة: {TEMP_URLS.metrics()}")
             await query.edit_message_text(
                 "❌ انتهت صلاحية الرابط!\n"
                 "الرجاء إرسال الرابط مرة أخرى."
@@ -689,91 +1375,27 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return
         
         logger.info(f"✅ تم استعادة الرابط: {url}")
+        bot_stats.add_user(query.from_user.id)
+        bot_stats.add_download(format_type)
         
-        # بدء التحميل
-        await query.edit_message_text("📥 جاري بدء التحميل...")
+        chat_id = query.message.chat.id
+        message_id = query.message.message_id
         
-        try:
-            file_path = await download_bot.download_video(
-                url=url,
-                quality=quality,
-                format_type=format_type,
-                chat_id=query.message.chat.id,
-                message_id=query.message.message_id,
-                context=context
-            )
-            
-            if file_path and os.path.exists(file_path):
-                file_size = os.path.getsize(file_path)
-                
-                # فحص حجم الملف (حد تلقرام 50 ميجا)
-                if file_size > 50 * 1024 * 1024:
-                    await query.edit_message_text(
-                        "❌ الملف كبير جداً (أكثر من 50 ميجا)!\n"
-                        "جرب جودة أقل أو اختر الصوت فقط."
-                    )
-                    # حذف الملف الكبير
-                    try:
-                        os.remove(file_path)
-                        shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
-                    except:
-                        pass
-                    return
-                
-                await query.edit_message_text("📤 جاري رفع الملف...")
-                
-                # إرسال الملف
-                with open(file_path, 'rb') as file:
-                    if format_type == "audio":
-                        await context.bot.send_audio(
-                            chat_id=query.message.chat.id,
-                            audio=file,
-                            caption="🎵 تم تحميل الصوت بنجاح!"
-                        )
-                    else:
-                        await context.bot.send_video(
-                            chat_id=query.message.chat.id,
-                            video=file,
-                            caption=f"🎬 تم تحميل الفيديو بنجاح!\n📊 الجودة: {quality}"
-                        )
-                
-                await query.edit_message_text("✅ تم التحميل والإرسال بنجاح!")
-                
-                # حذف الملف المؤقت
-                try:
-                    os.remove(file_path)
-                    shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
-                except:
-                    pass
-                    
-            else:
-                await query.edit_message_text(
-                    "❌ فشل في التحميل!\n"
-                    "الأسباب المحتملة:\n"
-                    "• المحتوى محمي أو خاص\n"
-                    "• الرابط منتهي الصلاحية\n"
-                    "• مشكلة في الاتصال\n"
-                    "• المنصة غير مدعومة حالياً\n\n"
-                    "جرب رابط آخر أو تأكد من صحة الرابط."
-                )
-                
-        except Exception as e:
-            logger.error(f"خطأ في التحميل: {e}")
-            error_msg = "❌ حدث خطأ أثناء التحميل!\n"
-            
-            # إضافة تفاصيل الخطأ للمطورين
-            if "HTTP Error 403" in str(e):
-                error_msg += "السبب: المحتوى محمي أو غير متاح"
-            elif "Video unavailable" in str(e):
-                error_msg += "السبب: الفيديو غير متاح أو محذوف"
-            elif "Private video" in str(e):
-                error_msg += "السبب: الفيديو خاص"
-            elif "This video is not available" in str(e):
-                error_msg += "السبب: الفيديو غير متاح في منطقتك"
-            else:
-                error_msg += "حاول مرة أخرى أو جرب رابط آخر"
-            
-            await query.edit_message_text(error_msg)
+        # في وضع العنقود تُرسل المهمة إلى قائمة مشتركة ينفذها عمال التحميل
+        if cluster_queue is not None:
+            job_id = await cluster_queue.run(cluster_queue.enqueue, {
+                'chat_id': chat_id,
+                'message_id': message_id,
+                'user_id': query.from_user.id,
+                'url': url,
+                'format_type': format_type,
+                'quality': quality,
+            })
+            logger.info(f"📨 تمت إضافة المهمة {job_id} إلى قائمة العنقود")
+            await query.edit_message_text("⏳ تمت إضافة طلبك إلى قائمة التحميل...")
+            return
+        
+        await process_download(context, chat_id, message_id, query.from_user.id, url, format_type, quality)
     
     else:
         await query.edit_message_text("❌ خطأ غير معروف!")
@@ -841,20 +1463,62 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     except Exception as e:
         logger.error(f"خطأ في إرسال رسالة الخطأ: {e}")
 
+def _start_background_tasks():
+    """تجهيز yt-dlp وتنظيف ملفات التشغيلات السابقة في الخلفية وتشغيل المنظف الدوري (داخل حلقة الأحداث)"""
+    start_warmup(workspace.sweep)
+    workspace.start_janitor()
+
+async def _post_init(application):
+    """بعد تهيئة البوت وقبل الاستطلاع: المهام الخلفية وخادم المقاييس"""
+    _start_background_tasks()
+    await start_metrics_server()
+    startup_timer.mark('جاهز لاستقبال التحديثات')
+
+async def _post_shutdown(application):
+    """إغلاق المجمعات المشتركة عند الإيقاف (في وضعي الاستطلاع والويب هوك)"""
+    ydl_pool.clear()
+    download_pool.shutdown(wait=False)
+    postprocess_pool.shutdown(wait=False)
+
+def build_application(bot=None):
+    """إنشاء التطبيق وتسجيل المعالجات (bot جاهز اختياري لأدوات القياس)"""
+    if bot is None:
+        builder = (
+            configure_builder(Application.builder())
+            .token(BOT_TOKEN)
+            .rate_limiter(OutboundRateLimiter())
+        )
+    else:
+        builder = Application.builder().bot(bot)
+    builder = (
+        builder
+        # معالجة تحديثات المستخدمين بالتوازي حتى لا ينتظر الجميع خلف تحميل واحد
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_shutdown(_post_shutdown)
+    )
+    if BOT_MODE != 'webhook':
+        # وضع الويب هوك يعرض المقاييس على خادمه ويجهز yt-dlp بعد تسجيل الويب هوك
+        builder = builder.post_init(_post_init)
+    application = builder.build()
+    
+    # إضافة المعالجات
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    application.add_handler(CallbackQueryHandler(button_callback))
+    application.add_error_handler(error_handler)
+    return application
+
 def main():
     """بدء تشغيل البوت"""
     print("🚀 جاري بدء تشغيل بوت التحميل الاحترافي...")
     
     try:
-        # إنشاء التطبيق
-        application = Application.builder().token(BOT_TOKEN).build()
+        startup_timer.mark('انتهاء استيراد الوحدات')
         
-        # إضافة المعالجات
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-        application.add_handler(CallbackQueryHandler(button_callback))
-        application.add_error_handler(error_handler)
+        # إنشاء التطبيق
+        with startup_timer.phase('build'):
+            application = build_application()
         
         # بدء البوت
         print("🤖 تم بدء تشغيل البوت بنجاح!")
@@ -865,10 +1529,14 @@ def main():
         print("\n🔗 أرسل رابط فيديو للبوت لبدء التحميل!")
         
         # بدء استقبال التحديثات
-        application.run_polling(
-            drop_pending_updates=True,
-            allowed_updates=Update.ALL_TYPES
-        )
+        if BOT_MODE == 'webhook':
+            print("🌐 وضع الويب هوك مفعل")
+            asyncio.run(run_webhook(application, on_ready=_start_background_tasks))
+        else:
+            application.run_polling(
+                drop_pending_updates=True,
+                allowed_updates=Update.ALL_TYPES
+            )
                 
     except Exception as e:
         logger.error(f"حدث خطأ في الدالة الرئيسية: {e}")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# عنوان Bot API (خادم محلي مثل http://localhost:8081/bot عند التحديد)
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+TELEGRAM_API_FILE_URL = os.getenv('TELEGRAM_API_FILE_URL')
+
+# الخادم المحلي يقرأ الملفات من القرص مباشرة ويسمح بملفات حتى 2000 ميجا
+LOCAL_BOT_API = bool(TELEGRAM_API_BASE_URL)
+PUBLIC_UPLOAD_LIMIT = 50 * 1024 * 1024
+LOCAL_UPLOAD_LIMIT = 2000 * 1024 * 1024
+UPLOAD_LIMIT = int(os.getenv(
+    'UPLOAD_LIMIT_BYTES',
+    str(LOCAL_UPLOAD_LIMIT if LOCAL_BOT_API else PUBLIC_UPLOAD_LIMIT)
+))
+
+# عدد التحديثات المعالجة بالتوازي (بدونها ينتظر كل مستخدم انتهاء تحميل من قبله)
+CONCURRENT_UPDATES = int(os.getenv('TELEGRAM_CONCURRENT_UPDATES', '256'))
+
+# اتصالات Bot API الدائمة المتزامنة (الرفع وتعديل الرسائل) ومهلة انتظار اتصال متاح
+# افتراضياً اتصال لكل تحديث متوازٍ (نفس افتراضي PTB وهو 256) حتى لا ينتظر رفعٌ خلف رفع آخر
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', str(CONCURRENT_UPDATES)))
+TELEGRAM_POOL_TIMEOUT = float(os.getenv('TELEGRAM_POOL_TIMEOUT', '10'))
+
+
+def _file_url(base_url: str) -> str:
+    """اشتقاق عنوان الملفات من عنوان Bot API"""
+    if TELEGRAM_API_FILE_URL:
+        return TELEGRAM_API_FILE_URL
+    root, _, suffix = base_url.rstrip('/').rpartition('/')
+    return f"{root}/file/{suffix}"
+
+
+def telegram_request():
+    """طلبات Bot API عبر مجمع اتصالات دائمة (الافتراضي في Bot المستقل اتصال واحد فقط)"""
+    from telegram.request import HTTPXRequest
+
+    return HTTPXRequest(connection_pool_size=TELEGRAM_POOL_SIZE, pool_timeout=TELEGRAM_POOL_TIMEOUT)
+
+
+def bot_kwargs() -> Dict[str, Any]:
+    """معاملات إنشاء Bot/ExtBot حسب عنوان Bot API المحدد"""
+    kwargs = {'request': telegram_request()}
+    if LOCAL_BOT_API:
+        kwargs.update({
+            'base_url': TELEGRAM_API_BASE_URL,
+            'base_file_url': _file_url(TELEGRAM_API_BASE_URL),
+            'local_mode': True,
+        })
+    return kwargs
+
+
+def configure_builder(builder):
+    """تطبيق إعدادات مجمع الاتصالات وخادم Bot API المحلي على ApplicationBuilder"""
+    builder = (
+        builder
+        .connection_pool_size(TELEGRAM_POOL_SIZE)
+        .pool_timeout(TELEGRAM_POOL_TIMEOUT)
+    )
+    if LOCAL_BOT_API:
+        builder = (
+            builder
+            .base_url(TELEGRAM_API_BASE_URL)
+            .base_file_url(_file_url(TELEGRAM_API_BASE_URL))
+            .local_mode(True)
+        )
+        logger.info(f"🏠 استخدام خادم Bot API محلي: {TELEGRAM_API_BASE_URL}")
+    return builder
+
+
+@contextmanager
+def upload_source(file_path: str):
+    """مصدر الرفع: المسار نفسه في الوضع المحلي أو ملف مفتوح للرفع عبر الإنترنت"""
+    if LOCAL_BOT_API:
+        yield Path(file_path)
+        return
+    with open(file_path, 'rb') as file:
+        yield file
@@ -13,15 +13,28 @@ from urllib.parse import urlparse
 from typing import Optional, Dict, Any
 from datetime import datetime
 import time
+import copy
 
-import yt_dlp
-import requests
+# أول استيراد محلي حتى يشمل قياس الإقلاع استيراد بقية الوحدات
+from startup import startup_timer, start_warmup
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaVideo, InputMediaAudio
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from telegram.constants import ParseMode, ChatAction
 from telegram.error import TelegramError, Conflict
 from dotenv import load_dotenv
 
+from worker_pool import download_pool
+from pending_store import PendingStore
+from rate_limiter import OutboundRateLimiter
+from webhook_server import BOT_MODE, run_webhook
+from format_planner import plan_format
+from bot_api import UPLOAD_LIMIT, CONCURRENT_UPDATES, configure_builder, upload_source
+from download_engine import engine_options, downloaded_file
+from workspace import workspace
+from postprocess import postprocess_pool, prepare_audio
+from stage_timer import stage_timings
+from ydl_pool import ydl_pool
+
 # استيراد نظام الإحصائيات
 try:
     from stats_system import bot_stats
@@ -40,11 +53,23 @@ logger = logging.getLogger(__name__)
 # تحميل متغيرات البيئة
 load_dotenv()
 
-# إعداد مجلد التحميل المؤقت
-DOWNLOAD_PATH = tempfile.mkdtemp()
+# مجلد التحميل (ثابت ومحدود الحجم ويُنظف دورياً)
+DOWNLOAD_PATH = workspace.root
+
+# مخزن الروابط المرتبطة بأزرار التحميل (محدود ومنتهي الصلاحية)
+TEMP_URLS = PendingStore()
 
-# متغير لحفظ الروابط مؤقتاً
-TEMP_URLS = {}
+# إعدادات yt-dlp الثابتة لكل نوع (مسار الحفظ والصيغة المختارة تُمرر مع كل طلب)
+VIDEO_YDL_OPTS = {
+    'format': 'best[ext=mp4]/best',
+    'noplaylist': True,
+    'extract_flat': False,
+    **engine_options(),
+}
+AUDIO_YDL_OPTS = {
+    **VIDEO_YDL_OPTS,
+    'format': 'bestaudio[ext=m4a]/bestaudio/best',
+}
 
 # المنصات المدعومة
 SUPPORTED_PLATFORMS = {
@@ -59,20 +84,14 @@ SUPPORTED_PLATFORMS = {
     'vimeo.com': '🎥 فيميو'
 }
 
-async def reset_webhook():
+async def reset_webhook(bot):
     """إعادة تعيين الويب هوك"""
     try:
-        bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        if not bot_token:
-            logger.error("لم يتم العثور على توكن البوت")
-            return
-            
-        url = f"https://api.telegram.org/bot{bot_token}/deleteWebhook"
-        response = requests.post(url)
-        if response.status_code == 200:
+        # عبر اتصالات Bot API الدائمة للبوت نفسه دون حجب حلقة الأحداث
+        if await bot.delete_webhook():
             logger.info("تم حذف الويب هوك بنجاح")
         else:
-            logger.error(f"فشل في حذف الويب هوك: {response.text}")
+            logger.error("فشل في حذف الويب هوك")
     except Exception as e:
         logger.error(f"خطأ في إعادة تعيين الويب هوك: {e}")
 
@@ -97,6 +116,26 @@ def get_platform_name(url: str) -> str:
     except:
         return "🌐 غير محدد"
 
+def _extract_info_job(url: str, profile: str, ydl_opts: dict):
+    """استخراج معلومات الفيديو (يعمل داخل مجمع العمال)"""
+    with ydl_pool.checkout(profile, ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        return ydl.sanitize_info(info, remove_private_keys=True)
+
+def _download_job(url: str, profile: str, ydl_opts: dict, outtmpl: str,
+                  format_selector: Optional[str] = None, info: Optional[dict] = None) -> Optional[str]:
+    """تحميل الملف من المعلومات المستخرجة وإرجاع مساره النهائي (يعمل داخل مجمع العمال)"""
+    # استيراد متأخر: yt-dlp لا يؤخر الإقلاع ويُجهز في الخلفية
+    import yt_dlp
+    
+    with ydl_pool.checkout(profile, ydl_opts, outtmpl, format_selector) as ydl:
+        if info is not None:
+            try:
+                return downloaded_file(ydl.process_ie_result(copy.deepcopy(info), download=True))
+            except yt_dlp.utils.DownloadError as e:
+                logger.warning(f"فشل التحميل من المعلومات المستخرجة، إعادة الاستخراج: {e}")
+        return downloaded_file(ydl.extract_info(url, download=True))
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالج أمر البداية"""
     user = update.effective_user
@@ -191,7 +230,7 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # إنشاء معرف قصير للرابط
     url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
-    TEMP_URLS[url_hash] = url
+    TEMP_URLS.put(url_hash, url)
     
     logger.info(f"تم حفظ الرابط بالمعرف: {url_hash}")
     
@@ -239,7 +278,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # البحث عن الرابط
-    if url_hash not in TEMP_URLS:
+    url = await TEMP_URLS.get(url_hash)
+    if url is None:
         await query.edit_message_text(
             "❌ *انتهت صلاحية الرابط*\n\n"
             "🔄 يرجى إرسال الرابط مرة أخرى",
@@ -247,7 +287,6 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    url = TEMP_URLS[url_hash]
     logger.info(f"تم العثور على الرابط: {url}")
     
     # تحديث إحصائيات التحميل
@@ -261,80 +300,82 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await download_audio(query, url)
     
     # حذف الرابط من الذاكرة المؤقتة
-    del TEMP_URLS[url_hash]
+    await TEMP_URLS.pop(url_hash)
 
 async def download_video(query, url: str, quality: str):
     """تحميل الفيديو"""
+    # مجلد فريد لهذه المهمة
+    job_dir = workspace.create_job_dir('video_')
     try:
         await query.edit_message_text("🎬 *بدء تحميل الفيديو...*", parse_mode=ParseMode.MARKDOWN)
         
-        # إعداد yt-dlp للفيديو
-        ydl_opts = {
-            'format': 'best[ext=mp4]/best',
-            'outtmpl': os.path.join(DOWNLOAD_PATH, '%(title)s.%(ext)s'),
-            'noplaylist': True,
-            'extract_flat': False,
-        }
+        # استخراج معلومات الفيديو
+        info = await download_pool.run(_extract_info_job, url, 'video', VIDEO_YDL_OPTS)
+        title = info.get('title', 'فيديو')
+        duration = info.get('duration', 0)
+        uploader = info.get('uploader', 'غير محدد')
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # استخراج معلومات الفيديو
-            info = ydl.extract_info(url, download=False)
-            title = info.get('title', 'فيديو')
-            duration = info.get('duration', 0)
-            uploader = info.get('uploader', 'غير محدد')
-            
-            # تحديث الرسالة
+        # اختيار صيغة تناسب حد الرفع قبل بدء التحميل
+        plan = plan_format(info, 'video', UPLOAD_LIMIT)
+        if plan['fits'] is False:
             await query.edit_message_text(
-                f"📥 *جاري تحميل الفيديو...*\n\n"
-                f"📝 *العنوان:* {title[:50]}...\n"
-                f"⏱️ *المدة:* {duration//60}:{duration%60:02d}\n"
-                f"👤 *المنشئ:* {uploader}",
+                "❌ *الملف كبير جداً*\n\n"
+                f"📊 *الحجم المتوقع:* {plan['estimated_size']/1024/1024:.1f} MB\n"
+                f"⚠️ *الحد الأقصى:* {UPLOAD_LIMIT // (1024 * 1024)} MB\n\n"
+                "💡 جرب تحميل الصوت فقط",
                 parse_mode=ParseMode.MARKDOWN
             )
-            
-            # تحميل الفيديو
-            ydl.download([url])
-            
-            # البحث عن الملف المحمل
-            for file in os.listdir(DOWNLOAD_PATH):
-                if file.endswith(('.mp4', '.mkv', '.webm', '.avi')):
-                    file_path = os.path.join(DOWNLOAD_PATH, file)
-                    
-                    # التحقق من حجم الملف
-                    file_size = os.path.getsize(file_path)
-                    if file_size > 50 * 1024 * 1024:  # 50 MB
-                        await query.edit_message_text(
-                            "❌ *الملف كبير جداً*\n\n"
-                            f"📊 *الحجم:* {file_size/1024/1024:.1f} MB\n"
-                            "⚠️ *الحد الأقصى:* 50 MB\n\n"
-                            "💡 جرب تحميل الصوت فقط",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                        os.remove(file_path)
-                        return
-                    
-                    # رفع الفيديو
-                    await query.edit_message_text("📤 *جاري رفع الفيديو...*", parse_mode=ParseMode.MARKDOWN)
-                    
-                    with open(file_path, 'rb') as video_file:
-                        await query.message.reply_video(
-                            video=video_file,
-                            caption=f"🎬 *{title}*\n\n⏱️ المدة: {duration//60}:{duration%60:02d}\n👤 المنشئ: {uploader}",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    
-                    # حذف الملف
-                    os.remove(file_path)
-                    
-                    await query.edit_message_text(
-                        "✅ *تم تحميل الفيديو بنجاح!*\n\n"
-                        "🎉 استمتع بالمشاهدة!",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                    return
-            
+            return
+        
+        # تحديث الرسالة
+        await query.edit_message_text(
+            f"📥 *جاري تحميل الفيديو...*\n\n"
+            f"📝 *العنوان:* {title[:50]}...\n"
+            f"⏱️ *المدة:* {duration//60}:{duration%60:02d}\n"
+            f"👤 *المنشئ:* {uploader}",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        
+        # تحميل الفيديو بعد التأكد من توفر المساحة
+        async with workspace.admit(plan['estimated_size']):
+            with stage_timings.measure('download'):
+                file_path = await download_pool.run(
+                    _download_job, url, 'video', VIDEO_YDL_OPTS,
+                    os.path.join(job_dir, '%(title)s.%(ext)s'), plan['format'], info
+                )
+        
+        if not file_path or not os.path.exists(file_path):
             await query.edit_message_text("❌ لم يتم العثور على ملف الفيديو")
-            
+            return
+        
+        # التحقق من حجم الملف
+        file_size = os.path.getsize(file_path)
+        if file_size > UPLOAD_LIMIT:
+            await query.edit_message_text(
+                "❌ *الملف كبير جداً*\n\n"
+                f"📊 *الحجم:* {file_size/1024/1024:.1f} MB\n"
+                f"⚠️ *الحد الأقصى:* {UPLOAD_LIMIT // (1024 * 1024)} MB\n\n"
+                "💡 جرب تحميل الصوت فقط",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        # رفع الفيديو
+        await query.edit_message_text("📤 *جاري رفع الفيديو...*", parse_mode=ParseMode.MARKDOWN)
+        
+        with stage_timings.measure('upload'), upload_source(file_path) as video_file:
+            await query.message.reply_video(
+                video=video_file,
+                caption=f"🎬 *{title}*\n\n⏱️ المدة: {duration//60}:{duration%60:02d}\n👤 المنشئ: {uploader}",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        
+        await query.edit_message_text(
+            "✅ *تم تحميل الفيديو بنجاح!*\n\n"
+            "🎉 استمتع بالمشاهدة!",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        
     except Exception as e:
         logger.error(f"خطأ في تحميل الفيديو: {e}")
         await query.edit_message_text(
@@ -343,83 +384,87 @@ async def download_video(query, url: str, quality: str):
             "💡 جرب رابطاً آخر أو تحميل الصوت فقط",
             parse_mode=ParseMode.MARKDOWN
         )
+    finally:
+        # حذف مجلد المهمة مع أي ملفات جزئية
+        workspace.remove(job_dir)
 
 async def download_audio(query, url: str):
     """تحميل الصوت"""
+    # مجلد فريد لهذه المهمة
+    job_dir = workspace.create_job_dir('audio_')
     try:
         await query.edit_message_text("🎵 *بدء استخراج الصوت...*", parse_mode=ParseMode.MARKDOWN)
         
-        # إعداد yt-dlp للصوت
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': os.path.join(DOWNLOAD_PATH, '%(title)s.%(ext)s'),
-            'noplaylist': True,
-            'extract_flat': False,
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-        }
+        # استخراج معلومات الفيديو
+        info = await download_pool.run(_extract_info_job, url, 'audio', AUDIO_YDL_OPTS)
+        title = info.get('title', 'صوت')
+        duration = info.get('duration', 0)
+        uploader = info.get('uploader', 'غير محدد')
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # استخراج معلومات الفيديو
-            info = ydl.extract_info(url, download=False)
-            title = info.get('title', 'صوت')
-            duration = info.get('duration', 0)
-            uploader = info.get('uploader', 'غير محدد')
-            
-            # تحديث الرسالة
+        # رفض الملفات الصوتية الطويلة قبل التحميل
+        plan = plan_format(info, 'audio', UPLOAD_LIMIT)
+        if plan['fits'] is False:
             await query.edit_message_text(
-                f"🎵 *جاري استخراج الصوت...*\n\n"
-                f"📝 *العنوان:* {title[:50]}...\n"
-                f"⏱️ *المدة:* {duration//60}:{duration%60:02d}\n"
-                f"👤 *المنشئ:* {uploader}",
+                "❌ *الملف الصوتي كبير جداً*\n\n"
+                f"📊 *الحجم المتوقع:* {plan['estimated_size']/1024/1024:.1f} MB\n"
+                f"⚠️ *الحد الأقصى:* {UPLOAD_LIMIT // (1024 * 1024)} MB",
                 parse_mode=ParseMode.MARKDOWN
             )
-            
-            # تحميل واستخراج الصوت
-            ydl.download([url])
-            
-            # البحث عن الملف الصوتي
-            for file in os.listdir(DOWNLOAD_PATH):
-                if file.endswith('.mp3'):
-                    file_path = os.path.join(DOWNLOAD_PATH, file)
-                    
-                    # التحقق من حجم الملف
-                    file_size = os.path.getsize(file_path)
-                    if file_size > 50 * 1024 * 1024:  # 50 MB
-                        await query.edit_message_text(
-                            "❌ *الملف الصوتي كبير جداً*\n\n"
-                            f"📊 *الحجم:* {file_size/1024/1024:.1f} MB\n"
-                            "⚠️ *الحد الأقصى:* 50 MB",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                        os.remove(file_path)
-                        return
-                    
-                    # رفع الملف الصوتي
-                    await query.edit_message_text("📤 *جاري رفع الملف الصوتي...*", parse_mode=ParseMode.MARKDOWN)
-                    
-                    with open(file_path, 'rb') as audio_file:
-                        await query.message.reply_audio(
-                            audio=audio_file,
-                            caption=f"🎵 *{title}*\n\n⏱️ المدة: {duration//60}:{duration%60:02d}\n👤 المنشئ: {uploader}",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    
-                    # حذف الملف
-                    os.remove(file_path)
-                    
-                    await query.edit_message_text(
-                        "✅ *تم استخراج الصوت بنجاح!*\n\n"
-                        "🎧 استمتع بالاستماع!",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                    return
-            
+            return
+        
+        # تحديث الرسالة
+        await query.edit_message_text(
+            f"🎵 *جاري استخراج الصوت...*\n\n"
+            f"📝 *العنوان:* {title[:50]}...\n"
+            f"⏱️ *المدة:* {duration//60}:{duration%60:02d}\n"
+            f"👤 *المنشئ:* {uploader}",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        
+        # تحميل الصوت بعد التأكد من توفر المساحة
+        async with workspace.admit(plan['estimated_size']):
+            with stage_timings.measure('download'):
+                file_path = await download_pool.run(
+                    _download_job, url, 'audio', AUDIO_YDL_OPTS,
+                    os.path.join(job_dir, '%(title)s.%(ext)s'), None, info
+                )
+        
+        # نسخ الصوت أو تحويله إلى MP3 في مجمع FFmpeg المستقل
+        if file_path:
+            with stage_timings.measure('postprocess'):
+                file_path = await postprocess_pool.run(prepare_audio, file_path)
+        
+        if not file_path or not os.path.exists(file_path):
             await query.edit_message_text("❌ لم يتم العثور على الملف الصوتي")
-            
+            return
+        
+        # التحقق من حجم الملف
+        file_size = os.path.getsize(file_path)
+        if file_size > UPLOAD_LIMIT:
+            await query.edit_message_text(
+                "❌ *الملف الصوتي كبير جداً*\n\n"
+                f"📊 *الحجم:* {file_size/1024/1024:.1f} MB\n"
+                f"⚠️ *الحد الأقصى:* {UPLOAD_LIMIT // (1024 * 1024)} MB",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        # رفع الملف الصوتي
+        await query.edit_message_text("📤 *جاري رفع الملف الصوتي...*", parse_mode=ParseMode.MARKDOWN)
+        
+        with stage_timings.measure('upload'), upload_source(file_path) as audio_file:
+            await query.message.reply_audio(
+                audio=audio_file,
+                caption=f"🎵 *{title}*\n\n⏱️ المدة: {duration//60}:{duration%60:02d}\n👤 المنشئ: {uploader}",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        
+        await query.edit_message_text(
+            "✅ *تم استخراج الصوت بنجاح!*\n\n"
+            "🎧 استمتع بالاستماع!",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        
     except Exception as e:
         logger.error(f"خطأ في استخراج الصوت: {e}")
         await query.edit_message_text(
@@ -428,6 +473,9 @@ async def download_audio(query, url: str):
             "💡 جرب رابطاً آخر",
             parse_mode=ParseMode.MARKDOWN
         )
+    finally:
+        # حذف مجلد المهمة مع أي ملفات جزئية
+        workspace.remove(job_dir)
 
 async def handle_other_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالج الرسائل الأخرى"""
@@ -441,6 +489,23 @@ async def handle_other_messages(update: Update, context: ContextTypes.DEFAULT_TY
         parse_mode=ParseMode.MARKDOWN
     )
 
+def _start_background_tasks():
+    """تجهيز yt-dlp وتنظيف ملفات التشغيلات السابقة في الخلفية وتشغيل المنظف الدوري (داخل حلقة الأحداث)"""
+    start_warmup(workspace.sweep)
+    workspace.start_janitor()
+
+async def _post_init(application):
+    """بعد تهيئة البوت وقبل الاستطلاع (وضع الاستطلاع فقط): إعادة تعيين الويب هوك والمهام الخلفية"""
+    await reset_webhook(application.bot)
+    _start_background_tasks()
+    startup_timer.mark('جاهز لاستقبال التحديثات')
+
+async def _post_shutdown(application):
+    """إغلاق المجمعات المشتركة عند الإيقاف (في وضعي الاستطلاع والويب هوك)"""
+    ydl_pool.clear()
+    download_pool.shutdown(wait=False)
+    postprocess_pool.shutdown(wait=False)
+
 def main():
     """الدالة الرئيسية"""
     # التحقق من وجود التوكن
@@ -450,12 +515,20 @@ def main():
         return
     
     logger.info("🚀 بدء تشغيل البوت...")
-    
-    # إعادة تعيين الويب هوك
-    asyncio.run(reset_webhook())
+    startup_timer.mark('انتهاء استيراد الوحدات')
     
     # إنشاء التطبيق
-    application = Application.builder().token(bot_token).build()
+    with startup_timer.phase('build'):
+        application = (
+            configure_builder(Application.builder())
+            .token(bot_token)
+            .rate_limiter(OutboundRateLimiter())
+            # معالجة تحديثات المستخدمين بالتوازي حتى لا ينتظر الجميع خلف تحميل واحد
+            .concurrent_updates(CONCURRENT_UPDATES)
+            .post_init(_post_init)
+            .post_shutdown(_post_shutdown)
+            .build()
+        )
     
     # إضافة المعالجات
     application.add_handler(CommandHandler("start", start))
@@ -483,10 +556,14 @@ def main():
     
     # تشغيل البوت
     try:
-        application.run_polling(
-            allowed_updates=Update.ALL_TYPES,
-            drop_pending_updates=True
-        )
+        if BOT_MODE == 'webhook':
+            logger.info("🌐 وضع الويب هوك مفعل")
+            asyncio.run(run_webhook(application, on_ready=_start_background_tasks))
+        else:
+            application.run_polling(
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True
+            )
     except Conflict:
         logger.error("❌ تعارض في getUpdates - يرجى إيقاف النسخ الأخرى من البوت")
     except Exception as e:
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import os
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# مسار قائمة المهام المشتركة (تفعيل وضع العنقود عند تحديده)
+CLUSTER_QUEUE_PATH = os.getenv('CLUSTER_QUEUE_PATH')
+DEFAULT_LEASE_SECONDS = int(os.getenv('CLUSTER_LEASE_SECONDS', '120'))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv('CLUSTER_MAX_ATTEMPTS', '3'))
+
+
+class ClusterQueue:
+    """قائمة مهام مشتركة في SQLite بين الواجهات وعمال التحميل"""
+
+    def __init__(self, db_path: str, lease_seconds: Optional[int] = None,
+                 max_attempts: Optional[int] = None):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds or DEFAULT_LEASE_SECONDS
+        self.max_attempts = max_attempts or DEFAULT_MAX_ATTEMPTS
+
+        self._lock = threading.Lock()
+        # عمليات القائمة قد تنتظر قفل SQLite حتى 30 ثانية فتُنفذ في خيط خاص بدل حلقة الأحداث
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cluster-db')
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "payload TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'queued', "
+            "worker TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "lease_until REAL, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    async def run(self, func, *args):
+        """تنفيذ عملية على القائمة (مثل claim أو complete) في خيط القائمة"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def enqueue(self, payload: Dict[str, Any]) -> int:
+        """إضافة مهمة إلى القائمة"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (payload, created_at, updated_at) VALUES (?, ?, ?)",
+                (json.dumps(payload), now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker_id: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """حجز أقدم مهمة متاحة لعامل (عملية ذرية بين العمليات)"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired(now)
+                row = self._db.execute(
+                    "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                    "lease_until = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, now + self.lease_seconds, now, row[0])
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return row[0], json.loads(row[1])
+
+    def _requeue_expired(self, now):
+        """إعادة المهام التي انتهت مهلة عمالها (مثلاً بعد توقف العامل)"""
+        self._db.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired', updated_at = ? "
+            "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+            (now, now, self.max_attempts)
+        )
+        cursor = self._db.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? "
+            "WHERE status = 'running' AND lease_until < ?",
+            (now, now)
+        )
+        if cursor.rowcount > 0:
+            logger.warning(f"♻️ تمت إعادة {cursor.rowcount} مهمة انتهت مهلتها إلى القائمة")
+
+    def heartbeat(self, job_id: int, worker_id: str):
+        """تمديد مهلة مهمة قيد التنفيذ"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, time.time(), job_id, worker_id)
+            )
+
+    def complete(self, job_id: int):
+        """تسجيل انتهاء مهمة"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', lease_until = NULL, updated_at = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+
+    def fail(self, job_id: int, error: str):
+        """تسجيل فشل مهمة"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                (error[:500], time.time(), job_id)
+            )
+
+    def purge(self, older_than: float = 24 * 3600):
+        """حذف المهام المنتهية القديمة"""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than,)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """عدد المهام حسب الحالة"""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+
+# القائمة المشتركة (None في وضع العملية الواحدة)
+cluster_queue = ClusterQueue(CLUSTER_QUEUE_PATH) if CLUSTER_QUEUE_PATH else None
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# عدد أجزاء HLS/DASH التي تُحمل بالتوازي لكل مهمة
+DEFAULT_FRAGMENT_CONCURRENCY = int(os.getenv('FRAGMENT_CONCURRENCY', '4'))
+
+# سياسة إعادة المحاولة للأجزاء وللطلبات الكاملة
+DEFAULT_FRAGMENT_RETRIES = int(os.getenv('FRAGMENT_RETRIES', '10'))
+DEFAULT_RETRIES = int(os.getenv('DOWNLOAD_RETRIES', '5'))
+MAX_RETRY_SLEEP = float(os.getenv('FRAGMENT_RETRY_MAX_SLEEP', '8'))
+
+
+def _retry_sleep(n: int) -> float:
+    """انتظار متزايد بين محاولات الجزء الفاشل (yt-dlp يمرر رقم المحاولة كمعامل n، ودالة عامة لتعمل مع مجمع العمليات)"""
+    return min(MAX_RETRY_SLEEP, 0.5 * (2 ** n))
+
+
+def engine_options() -> Dict[str, Any]:
+    """إعدادات yt-dlp لتحميل الأجزاء بالتوازي مع إعادة المحاولة"""
+    return {
+        'concurrent_fragment_downloads': max(1, DEFAULT_FRAGMENT_CONCURRENCY),
+        'fragment_retries': DEFAULT_FRAGMENT_RETRIES,
+        'retries': DEFAULT_RETRIES,
+        'retry_sleep_functions': {
+            'fragment': _retry_sleep,
+            'http': _retry_sleep,
+        },
+        # جزء مفقود يفسد الملف، فالأفضل فشل المهمة بدلاً من تخطيه
+        'skip_unavailable_fragments': False,
+    }
+
+
+def downloaded_file(info: Optional[Dict[str, Any]]) -> Optional[str]:
+    """مسار الملف النهائي كما أبلغ عنه yt-dlp بعد المعالجة اللاحقة"""
+    downloads = (info or {}).get('requested_downloads') or []
+    if not downloads:
+        return None
+    return downloads[0].get('filepath') or downloads[0].get('_filename')
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import socket
+import asyncio
+from types import SimpleNamespace
+
+from telegram.ext import ExtBot
+
+from bot import BOT_TOKEN, process_download
+from cluster_queue import cluster_queue
+from rate_limiter import OutboundRateLimiter
+from bot_api import bot_kwargs
+from workspace import workspace
+from metrics import start_metrics_server
+from startup import start_warmup
+
+logger = logging.getLogger(__name__)
+
+# عدد المهام التي ينفذها العامل في نفس الوقت
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '2'))
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '1'))
+
+
+async def _heartbeat(queue, job_id, worker_id):
+    """تمديد مهلة المهمة طالما العامل يعمل عليها"""
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        await queue.run(queue.heartbeat, job_id, worker_id)
+
+
+async def worker_loop(queue, context, worker_id):
+    """حجز المهام من القائمة المشتركة وتنفيذها"""
+    while True:
+        job = await queue.run(queue.claim, worker_id)
+        if job is None:
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            continue
+
+        job_id, payload = job
+        logger.info(f"📥 العامل {worker_id} بدأ المهمة {job_id}")
+        heartbeat = asyncio.create_task(_heartbeat(queue, job_id, worker_id))
+        try:
+            error = await process_download(
+                context,
+                payload['chat_id'],
+                payload['message_id'],
+                payload['user_id'],
+                payload['url'],
+                payload['format_type'],
+                payload['quality']
+            )
+        except Exception as e:
+            error = str(e)
+        finally:
+            heartbeat.cancel()
+
+        # process_download يبلغ المستخدم بالفشل ويعيد سببه بدلاً من رفع استثناء
+        if error:
+            logger.error(f"❌ فشلت المهمة {job_id}: {error}")
+            await queue.run(queue.fail, job_id, error)
+        else:
+            await queue.run(queue.complete, job_id)
+            logger.info(f"✅ العامل {worker_id} أنهى المهمة {job_id}")
+
+
+async def run_worker():
+    """تشغيل عامل تحميل مستقل"""
+    bot = ExtBot(BOT_TOKEN, rate_limiter=OutboundRateLimiter(), **bot_kwargs())
+    context = SimpleNamespace(bot=bot)
+    worker_prefix = f"{socket.gethostname()}-{os.getpid()}"
+
+    async with bot:
+        await start_metrics_server()
+        start_warmup()
+        workspace.start_janitor()
+        logger.info(f"🚀 بدأ عامل التحميل {worker_prefix} بعدد {WORKER_CONCURRENCY} مهام متزامنة")
+        await asyncio.gather(*[
+            worker_loop(cluster_queue, context, f"{worker_prefix}-{i}")
+            for i in range(WORKER_CONCURRENCY)
+        ])
+
+
+def main():
+    """نقطة تشغيل العامل"""
+    if cluster_queue is None:
+        raise ValueError("لم يتم تحديد CLUSTER_QUEUE_PATH! العامل يحتاج قائمة مهام مشتركة")
+    workspace.sweep()
+    asyncio.run(run_worker())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# الإعدادات الافتراضية لفهرس معرفات الملفات
+DEFAULT_MAX_ENTRIES = int(os.getenv('FILE_ID_CACHE_SIZE', '5000'))
+DEFAULT_DB_PATH = os.getenv('FILE_ID_CACHE_PATH', 'file_id_cache.db')
+
+# فترة حفظ أوقات الاستخدام المتراكمة على القرص بالثواني
+DEFAULT_FLUSH_INTERVAL = float(os.getenv('FILE_ID_FLUSH_INTERVAL', '30'))
+
+
+def extract_file_id(message) -> Optional[str]:
+    """استخراج file_id من رسالة تلقرام المرسلة"""
+    if message is None:
+        return None
+    for attr in ('video', 'audio', 'document', 'animation', 'voice'):
+        media = getattr(message, attr, None)
+        if media is not None:
+            return media.file_id
+    return None
+
+
+class FileIdCache:
+    """فهرس دائم لمعرفات ملفات تلقرام لإعادة إرسالها دون تحميل"""
+
+    def __init__(self, max_entries: Optional[int] = None, db_path: Optional[str] = None,
+                 flush_interval: Optional[float] = None):
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self.db_path = db_path if db_path is not None else DEFAULT_DB_PATH
+        self.flush_interval = flush_interval or DEFAULT_FLUSH_INTERVAL
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.flushes = 0
+        self.pruned = 0
+
+        # أوقات الاستخدام تُحدث في الذاكرة وتُحفظ دفعة واحدة من خيط خلفي
+        self._used: Dict[str, float] = {}
+        self._added = 0
+        self._db_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._db = None
+        # الكتابة وقراءة المعرفات غير الموجودة في الذاكرة تتم في خيط واحد حتى لا تعطل حلقة الأحداث
+        self._writer = None
+        if self.db_path:
+            self._open_db()
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='file-id-db')
+            atexit.register(self.close)
+
+    def _open_db(self):
+        """فتح قاعدة البيانات وتحميل المعرفات الأحدث استخداماً"""
+        # WAL ومهلة انتظار القفل حتى يشترك عدة عمال في الملف نفسه دون أخطاء "database is locked"
+        self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            "key TEXT PRIMARY KEY, file_id TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT key, file_id FROM file_ids ORDER BY last_used DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        for key, file_id in reversed(rows):
+            self._entries[key] = file_id
+        logger.info(f"💾 تم تحميل {len(self._entries)} معرف ملف من: {self.db_path}")
+
+    @staticmethod
+    def make_key(video_key: str, format_type: str, quality: str) -> str:
+        """مفتاح الفهرس من معرف الفيديو ونوع التنسيق والجودة"""
+        return f"{video_key}|{format_type}|{quality}"
+
+    def get(self, video_key: str, format_type: str, quality: str) -> Optional[str]:
+        """البحث عن file_id محفوظ في الذاكرة فقط"""
+        key = self.make_key(video_key, format_type, quality)
+        with self._lock:
+            file_id = self._entries.get(key)
+            if file_id is None:
+                self.misses += 1
+                return None
+            self._touch(key)
+            return file_id
+
+    async def lookup(self, video_key: str, format_type: str, quality: str) -> Optional[str]:
+        """البحث في الذاكرة ثم على القرص في خيط الكتابة (معرف حفظه عامل آخر)"""
+        key = self.make_key(video_key, format_type, quality)
+        with self._lock:
+            file_id = self._entries.get(key)
+            if file_id is not None:
+                self._touch(key)
+                return file_id
+        if self._writer is not None:
+            file_id = await asyncio.get_running_loop().run_in_executor(self._writer, self._load, key)
+        with self._lock:
+            if file_id is None:
+                self.misses += 1
+                return None
+            self._entries[key] = file_id
+            self._touch(key)
+            self._evict()
+            return file_id
+
+    def _touch(self, key: str):
+        """تسجيل استخدام معرف في الذاكرة (يُستدعى مع القفل)"""
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if self._db is not None:
+            self._used[key] = time.time()
+            self._start_flusher()
+
+    def _start_flusher(self):
+        """تشغيل خيط الحفظ عند أول استخدام (يُستدعى مع القفل)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, name='file-id-flush', daemon=True)
+            self._thread.start()
+
+    def flush(self) -> int:
+        """حفظ أوقات الاستخدام المتراكمة دفعة واحدة ثم حذف الأقدم استخداماً من القرص (يعيد عدد المعرفات المحفوظة)"""
+        with self._lock:
+            used, self._used = self._used, {}
+            added, self._added = self._added, 0
+        if (not used and not added) or self._db is None:
+            return 0
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    "UPDATE file_ids SET last_used = ? WHERE key = ?",
+                    [(last_used, key) for key, last_used in used.items()]
+                )
+                # القرص يحتفظ بأحدث المعرفات استخداماً من كل العمال، والإخراج من ذاكرة عامل لا يحذفها
+                cursor = self._db.execute(
+                    "DELETE FROM file_ids WHERE key NOT IN "
+                    "(SELECT key FROM file_ids ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"❌ تعذر حفظ أوقات استخدام المعرفات: {e}")
+            return 0
+        self.pruned += max(cursor.rowcount, 0)
+        self.flushes += 1
+        return len(used)
+
+    def _flush_loop(self):
+        """حفظ دوري في الخلفية"""
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """إيقاف خيط الحفظ وإنهاء الكتابات المعلقة وحفظ ما تبقى"""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+        self.flush()
+
+    def _write(self, statements):
+        """جدولة عمليات كتابة على القرص في خيط الكتابة (قائمة من (sql, params))"""
+        if self._writer is not None:
+            self._writer.submit(self._execute, statements)
+
+    def _execute(self, statements):
+        """تنفيذ عمليات الكتابة في معاملة واحدة"""
+        try:
+            with self._db_lock:
+                for sql, params in statements:
+                    self._db.executemany(sql, params)
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"❌ تعذر حفظ فهرس المعرفات: {e}")
+
+    def _load(self, key: str) -> Optional[str]:
+        """قراءة معرف من القرص (في خيط الكتابة)"""
+        try:
+            with self._db_lock:
+                row = self._db.execute("SELECT file_id FROM file_ids WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"❌ تعذر قراءة فهرس المعرفات: {e}")
+            return None
+        return row[0] if row else None
+
+    def _evict(self):
+        """حذف الأقدم استخداماً من الذاكرة عند تجاوز الحد (يُستدعى مع القفل)"""
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._used.pop(old_key, None)
+            self.evictions += 1
+
+    def set(self, video_key: str, format_type: str, quality: str, file_id: str):
+        """حفظ file_id بعد إرسال ناجح (فشل الحفظ لا يفشل الإرسال)"""
+        key = self.make_key(video_key, format_type, quality)
+        with self._lock:
+            self._entries[key] = file_id
+            self._entries.move_to_end(key)
+            self._evict()
+            if self._db is None:
+                return
+            self._write([
+                ("INSERT OR REPLACE INTO file_ids (key, file_id, last_used) VALUES (?, ?, ?)",
+                 [(key, file_id, time.time())]),
+            ])
+            # الزائد عن الحد على القرص يُحذف مع الحفظ الدوري التالي
+            self._added += 1
+            self._start_flusher()
+
+    def invalidate(self, video_key: str, format_type: str, quality: str):
+        """حذف file_id رفضه تلقرام"""
+        key = self.make_key(video_key, format_type, quality)
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+            self._used.pop(key, None)
+            self._write([("DELETE FROM file_ids WHERE key = ?", [(key,)])])
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات الفهرس"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'pending_writes': len(self._used),
+                'flushes': self.flushes,
+                'pruned': self.pruned,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+# الفهرس المشترك لمعرفات الملفات
+file_id_cache = FileIdCache()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# حد الرفع في Bot API العامة
+DEFAULT_UPLOAD_LIMIT = 50 * 1024 * 1024
+
+# هامش أمان لأن الأحجام التقريبية قد تقل عن الحجم الفعلي
+SIZE_MARGIN = float(os.getenv('FORMAT_SIZE_MARGIN', '0.95'))
+
+# معدل صوت MP3 الناتج (كيلوبت/ثانية)
+AUDIO_BITRATE_KBPS = 192
+
+
+def estimate_size(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[int]:
+    """تقدير حجم الصيغة من filesize أو filesize_approx أو tbr × المدة"""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    tbr = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0))
+    if tbr and duration:
+        return int(tbr * 1000 / 8 * duration)
+    return None
+
+
+def _is_progressive(fmt):
+    """صيغة تحتوي على الصورة والصوت معاً"""
+    return fmt.get('vcodec') not in (None, 'none') and fmt.get('acodec') not in (None, 'none')
+
+
+def plan_format(info: Dict[str, Any], format_type: str, limit: int = DEFAULT_UPLOAD_LIMIT) -> Dict[str, Any]:
+    """اختيار أفضل صيغة تناسب حد الرفع قبل تحميل أي بايت"""
+    budget = int(limit * SIZE_MARGIN)
+    duration = info.get('duration') or 0
+    formats = info.get('formats') or []
+
+    if format_type == 'audio':
+        # تقدير بمعدل MP3 الثابت (النسخ السريع لـ AAC ينتج عادةً ملفاً أصغر)
+        estimated = int(AUDIO_BITRATE_KBPS * 1000 / 8 * duration) if duration else None
+        return {
+            # تفضيل m4a (AAC) لأنه يُرسل بالنسخ دون إعادة ترميز
+            'format': 'bestaudio[ext=m4a]/bestaudio/best',
+            'estimated_size': estimated,
+            'fits': None if estimated is None else estimated <= budget,
+        }
+
+    candidates = []
+    unknown = False
+    for fmt in formats:
+        if not _is_progressive(fmt) or not fmt.get('format_id'):
+            continue
+        size = estimate_size(fmt, duration)
+        if size is None:
+            unknown = True
+            continue
+        candidates.append((fmt, size))
+
+    fitting = [(fmt, size) for fmt, size in candidates if size <= budget]
+    if fitting:
+        # تفضيل mp4 كما في الإعداد السابق ثم الدقة ثم المعدل
+        fmt, size = max(fitting, key=lambda item: (
+            item[0].get('ext') == 'mp4',
+            item[0].get('height') or 0,
+            item[0].get('tbr') or 0,
+        ))
+        return {'format': fmt['format_id'], 'estimated_size': size, 'fits': True}
+
+    # فلتر yt-dlp يستبعد الصيغ الكبيرة ويقبل غير معروفة الحجم
+    size_filter = f"[filesize<?{budget}][filesize_approx<?{budget}]"
+    fallback = f"best[ext=mp4]{size_filter}/best{size_filter}"
+
+    if candidates and not unknown:
+        smallest = min(size for _, size in candidates)
+        return {'format': fallback, 'estimated_size': smallest, 'fits': False}
+
+    return {'format': fallback, 'estimated_size': None, 'fits': None}
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+# الإعدادات الافتراضية للذاكرة المؤقتة
+DEFAULT_MAX_ENTRIES = int(os.getenv('METADATA_CACHE_SIZE', '1000'))
+DEFAULT_TTL = int(os.getenv('METADATA_CACHE_TTL', '1800'))
+DEFAULT_DB_PATH = os.getenv('METADATA_CACHE_PATH')
+
+# مدة الصلاحية لكل منصة بالثواني (حسب مفتاح المستخرج في yt-dlp)
+PLATFORM_TTLS = {
+    'Youtube': 3 * 3600,
+    'TikTok': 1800,
+    'TikTokVM': 1800,
+    'Instagram': 1800,
+    'Facebook': 1800,
+    'Twitter': 3600,
+    'Soundcloud': 6 * 3600,
+    'Vimeo': 3600,
+}
+
+
+# مستخرجات المنصات المدعومة فقط (فحص جميع مستخرجات yt-dlp يستغرق مئات الملي ثانية للرابط)
+KEY_EXTRACTORS = ('Youtube', 'TikTok', 'TikTokVM', 'Instagram', 'Facebook', 'Twitter', 'Soundcloud', 'Vimeo')
+
+# معاملات المشاركة والتتبع التي لا تغير الفيديو
+TRACKING_PARAMS = {
+    'si', 'feature', 'igsh', 'igshid', 'fbclid', 'ref', 'ref_src', 's', 't',
+    'is_from_webapp', 'sender_device', '_r', '_t',
+}
+
+
+def _strip_tracking(url: str) -> str:
+    """إزالة معاملات التتبع حتى تشترك الروابط المتطابقة في مفتاح واحد"""
+    parts = urlsplit(url)
+    query = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name not in TRACKING_PARAMS and not name.startswith('utm_')
+    ]
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+
+def canonical_video_key(url: str) -> str:
+    """إنشاء مفتاح موحد للفيديو من معرف المستخرج بدلاً من نص الرابط"""
+    return _extractor_key(_strip_tracking(url))
+
+
+@lru_cache(maxsize=4096)
+def _extractor_key(url: str) -> str:
+    """مفتاح المستخرج المطابق من مستخرجات المنصات المدعومة"""
+    from yt_dlp.extractor import get_info_extractor
+
+    for name in KEY_EXTRACTORS:
+        ie = get_info_extractor(name)
+        if ie.suitable(url):
+            video_id = ie.get_temp_id(url)
+            if video_id:
+                return f"{ie.ie_key()}:{video_id}"
+            break
+    return f"url:{url}"
+
+
+def info_video_key(info: Dict[str, Any]) -> Optional[str]:
+    """مفتاح الفيديو من نتيجة الاستخراج الفعلية"""
+    extractor = info.get('extractor_key')
+    video_id = info.get('id')
+    if extractor and video_id:
+        return f"{extractor}:{video_id}"
+    return None
+
+
+class MetadataCache:
+    """ذاكرة مؤقتة LRU مع مدة صلاحية لكل منصة لمعلومات الفيديو"""
+
+    def __init__(self, max_entries: Optional[int] = None, default_ttl: Optional[int] = None,
+                 platform_ttls: Optional[Dict[str, int]] = None, db_path: Optional[str] = None):
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self.default_ttl = default_ttl or DEFAULT_TTL
+        self.platform_ttls = platform_ttls if platform_ttls is not None else PLATFORM_TTLS
+        self.db_path = db_path if db_path is not None else DEFAULT_DB_PATH
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        # الكتابة على القرص في خيط واحد بالترتيب حتى لا تعطل حلقة الأحداث
+        self._writer = None
+        if self.db_path:
+            self._open_db()
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='metadata-db')
+
+    def _open_db(self):
+        """فتح قاعدة البيانات على القرص"""
+        # WAL ومهلة انتظار القفل لأن الملف قد يكون مشتركاً بين الواجهة والعمال
+        self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM metadata WHERE expires_at < ?", (time.time(),))
+        self._db.commit()
+        logger.info(f"💾 الذاكرة المؤقتة للمعلومات محفوظة في: {self.db_path}")
+
+    def ttl_for(self, key: str) -> int:
+        """مدة الصلاحية حسب المنصة"""
+        platform = key.split(':', 1)[0]
+        return self.platform_ttls.get(platform, self.default_ttl)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """قراءة معلومات الفيديو من الذاكرة فقط"""
+        with self._lock:
+            return self._fresh(key, self._entries.get(key))
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """قراءة من الذاكرة ثم من القرص في خيط الكتابة (معلومات حفظها عامل آخر)"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self._writer is not None:
+            entry = await asyncio.get_running_loop().run_in_executor(self._writer, self._load, key)
+        with self._lock:
+            return self._fresh(key, entry)
+
+    def _fresh(self, key, entry):
+        """إرجاع القيمة إن لم تنتهِ صلاحيتها وتسجيل الإصابة (يُستدعى مع القفل)"""
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.time():
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self._evict()
+                self.hits += 1
+                return value
+            self._delete(key)
+        self.misses += 1
+        return None
+
+    def _evict(self):
+        """حذف الأقدم استخداماً من الذاكرة والقرص عند تجاوز الحد (يُستدعى مع القفل)"""
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            self._write("DELETE FROM metadata WHERE key = ?", lambda old_key=old_key: (old_key,))
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None):
+        """حفظ معلومات الفيديو في الذاكرة المؤقتة"""
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl_for(key))
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._evict()
+            # تحويل المعلومات إلى JSON يتم في خيط الكتابة أيضاً
+            self._write(
+                "INSERT OR REPLACE INTO metadata (key, value, expires_at) VALUES (?, ?, ?)",
+                lambda: (key, json.dumps(value, default=str), expires_at)
+            )
+
+    def _write(self, sql: str, params):
+        """جدولة عملية كتابة على القرص (params دالة تُستدعى في خيط الكتابة)"""
+        if self._writer is not None:
+            self._writer.submit(self._execute, sql, params)
+
+    def _execute(self, sql: str, params):
+        """تنفيذ عملية كتابة في خيط الكتابة"""
+        try:
+            with self._db_lock:
+                self._db.execute(sql, params())
+                self._db.commit()
+        except Exception as e:
+            logger.error(f"❌ خطأ في حفظ المعلومات على القرص: {e}")
+
+    def invalidate(self, key: str):
+        """حذف مدخل من الذاكرة المؤقتة"""
+        with self._lock:
+            self._delete(key)
+
+    def _load(self, key):
+        """قراءة مدخل من القرص (في خيط الكتابة)"""
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM metadata WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                return None
+            return json.loads(row[0]), row[1]
+        except Exception as e:
+            logger.error(f"❌ خطأ في قراءة المعلومات من القرص: {e}")
+            return None
+
+    def _delete(self, key):
+        """حذف مدخل من الذاكرة والقرص"""
+        self._entries.pop(key, None)
+        self._write("DELETE FROM metadata WHERE key = ?", lambda: (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات الذاكرة المؤقتة"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+# الذاكرة المؤقتة المشتركة لمعلومات الفيديو
+metadata_cache = MetadataCache()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from stage_timer import stage_timings
+
+logger = logging.getLogger(__name__)
+
+# منفذ خادم المقاييس المستقل (لوضع الاستطلاع والعمال)، معطل إن لم يُحدد
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PATH = '/metrics'
+
+# حدود فئات المدرج التكراري للأزمنة بالثواني
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# مدة إعادة استخدام نتيجة stats() للمكونات خلال قراءة واحدة
+STATS_SNAPSHOT_TTL = 1.0
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value: float) -> str:
+    """تنسيق القيمة بصيغة Prometheus"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra: Optional[Dict[str, str]] = None) -> str:
+    """تنسيق التسميات {name="value"}"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.extend(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Metric:
+    """أساس المقاييس ذات التسميات"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """مفتاح السلسلة من قيم التسميات"""
+        if set(labels) != set(self.labels):
+            raise ValueError(f"تسميات غير صحيحة للمقياس {self.name}: {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        """أسطر المقياس بصيغة Prometheus"""
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.type_name}"
+        yield from self._samples()
+
+    def _samples(self):
+        return iter(())
+
+
+class Counter(_Metric):
+    """عداد يزداد فقط"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """زيادة العداد"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """القيمة الحالية لسلسلة"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        """جميع السلاسل وقيمها"""
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self):
+        for key, value in sorted(self.values().items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """قيمة لحظية تُقرأ عند الطلب من دالة أو تُضبط يدوياً"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 func: Optional[Callable[[], Any]] = None):
+        super().__init__(name, description, labels)
+        self.func = func
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        """ضبط القيمة"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        """زيادة القيمة"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        """إنقاص القيمة"""
+        self.inc(-amount, **labels)
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        """جميع السلاسل وقيمها (الدالة تعيد رقماً أو قاموساً من قيم التسميات)"""
+        if self.func is None:
+            with self._lock:
+                return dict(self._values)
+        result = self.func()
+        if isinstance(result, dict):
+            return {
+                (key if isinstance(key, tuple) else (key,)): value
+                for key, value in result.items()
+            }
+        return {(): result}
+
+    def _samples(self):
+        try:
+            values = self.values()
+        except Exception as e:
+            logger.error(f"❌ خطأ في قراءة المقياس {self.name}: {e}")
+            return
+        for key, value in sorted(values.items()):
+            if value is not None:
+                yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """مدرج تكراري تراكمي للأزمنة"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+
+    def observe(self, value: float, **labels):
+        """تسجيل قياس"""
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def _samples(self):
+        with self._lock:
+            series_items = sorted((key, dict(s, counts=list(s['counts']))) for key, s in self._series.items())
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                labels = _format_labels(self.labels, key, {'le': _format_value(bound)})
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}_sum{labels} {_format_value(series['sum'])}"
+            yield f"{self.name}_count{labels} {series['count']}"
+
+
+class MetricsRegistry:
+    """سجل المقاييس وتصديرها بصيغة Prometheus النصية"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"المقياس {metric.name} مسجل بنوع آخر")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str, labels: Tuple[str, ...] = ()) -> Counter:
+        """تسجيل عداد"""
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: Tuple[str, ...] = (),
+              func: Optional[Callable[[], Any]] = None) -> Gauge:
+        """تسجيل قيمة لحظية"""
+        return self._register(Gauge(name, description, labels, func))
+
+    def histogram(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """تسجيل مدرج تكراري"""
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def register_stats(self, prefix: str, stats_func: Callable[[], Dict[str, Any]], description: str):
+        """تصدير القيم الرقمية من دالة stats() لمكون كقيم لحظية"""
+        snapshot = {'at': 0.0, 'stats': {}}
+
+        def read(key):
+            # قراءة stats() مرة واحدة لكل طلب قراءة بدلاً من مرة لكل قيمة
+            now = time.monotonic()
+            if now - snapshot['at'] > STATS_SNAPSHOT_TTL:
+                snapshot['stats'] = stats_func()
+                snapshot['at'] = now
+            return snapshot['stats'].get(key)
+
+        for key, value in stats_func().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            self.gauge(f"{prefix}_{key}", f"{description}: {key}", func=lambda key=key: read(key))
+
+    def render(self) -> str:
+        """جميع المقاييس بصيغة Prometheus النصية"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# سجل المقاييس المشترك
+metrics = MetricsRegistry()
+
+started_at = time.time()
+metrics.gauge('bot_uptime_seconds', 'مدة تشغيل العملية', func=lambda: round(time.time() - started_at, 1))
+
+# أزمنة مراحل خط التحميل (تحليل، تحميل، معالجة، رفع)
+stage_seconds = metrics.histogram('bot_stage_seconds', 'زمن تنفيذ كل مرحلة من خط التحميل', ('stage',))
+stage_timings.add_listener(lambda stage, seconds: stage_seconds.observe(seconds, stage=stage))
+
+# نتائج طلبات التحميل
+downloads_total = metrics.counter('bot_downloads_total', 'طلبات التحميل المكتملة', ('format', 'source'))
+download_failures = metrics.counter('bot_download_failures_total', 'طلبات التحميل الفاشلة حسب السبب', ('reason',))
+active_jobs = metrics.gauge('bot_active_jobs', 'طلبات التحميل قيد التنفيذ')
+active_jobs.set(0)
+
+
+async def handle_metrics(request):
+    """نقطة قراءة المقاييس"""
+    from aiohttp import web
+
+    return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+
+def add_metrics_route(app, path: str = METRICS_PATH):
+    """إضافة نقطة المقاييس إلى تطبيق aiohttp"""
+    app.router.add_get(path, handle_metrics)
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """تشغيل خادم مقاييس مستقل (يعيد None إن لم يُحدد المنفذ)"""
+    if not port:
+        return None
+    # استيراد متأخر: aiohttp لا يُحمل إلا عند تشغيل الخادم
+    from aiohttp import web
+
+    app = web.Application()
+    add_metrics_route(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 خادم المقاييس يعمل على {host}:{port}{METRICS_PATH}")
+    return runner
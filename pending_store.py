@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# الإعدادات الافتراضية لمخزن الطلبات المعلقة
+DEFAULT_MAX_SIZE = int(os.getenv('PENDING_STORE_SIZE', '10000'))
+DEFAULT_TTL = int(os.getenv('PENDING_STORE_TTL', str(6 * 3600)))
+DEFAULT_DB_PATH = os.getenv('PENDING_STORE_PATH')
+
+# تنظيف قاعدة البيانات من المنتهية صلاحيتها والزائدة مرة كل عدد من الإضافات
+DEFAULT_PURGE_EVERY = int(os.getenv('PENDING_STORE_PURGE_EVERY', '100'))
+
+
+class PendingStore:
+    """مخزن محدود ومنتهي الصلاحية للروابط المرتبطة بأزرار التحميل"""
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[int] = None,
+                 db_path: Optional[str] = None, purge_every: Optional[int] = None):
+        self.max_size = max_size or DEFAULT_MAX_SIZE
+        self.ttl = ttl or DEFAULT_TTL
+        self.db_path = db_path if db_path is not None else DEFAULT_DB_PATH
+        self.purge_every = purge_every or DEFAULT_PURGE_EVERY
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+        self._db = None
+        # عمليات القاعدة تتم في خيط واحد بالترتيب حتى لا تعطل حلقة الأحداث
+        self._writer = None
+        self._puts = 0
+        self._db_size = 0
+        if self.db_path:
+            self._open_db()
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pending-db')
+
+    def _open_db(self):
+        """فتح قاعدة البيانات المشتركة بين العمليات"""
+        self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS pending_created ON pending (created_at)")
+        self._purge_db(time.time())
+        self._db.commit()
+        logger.info(f"💾 مخزن الطلبات المعلقة محفوظ في: {self.db_path}")
+
+    def put(self, key: str, value: Any):
+        """حفظ قيمة مرتبطة بمعرف قصير"""
+        now = time.time()
+        expires_at = now + self.ttl
+        if self._db is not None:
+            self._puts += 1
+            purge = self._puts % self.purge_every == 0
+            self._writer.submit(self._insert, key, json.dumps(value), now, expires_at, purge)
+            return
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._purge_memory(now)
+
+    async def get(self, key: str, default=None):
+        """قراءة قيمة إذا لم تنتهِ صلاحيتها"""
+        return await self._read(key, default, delete=False)
+
+    async def pop(self, key: str, default=None):
+        """قراءة قيمة وحذفها"""
+        return await self._read(key, default, delete=True)
+
+    async def _read(self, key: str, default, delete: bool):
+        """قراءة قيمة من الذاكرة أو من القاعدة في خيط الكتابة"""
+        if self._db is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._writer, self._read_db, key, default, delete
+            )
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None) if delete else self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                self._entries.pop(key, None)
+                self.expirations += 1
+                return default
+            return value
+
+    def _insert(self, key, value, created_at, expires_at, purge):
+        """إضافة قيمة في خيط الكتابة مع تنظيف دوري"""
+        # القاعدة لا يستخدمها إلا خيط الكتابة فلا حاجة لقفل يعطل حلقة الأحداث
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pending (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, value, created_at, expires_at)
+            )
+            self._db_size += 1
+            if purge:
+                self._purge_db(created_at)
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"❌ تعذر حفظ الطلب المعلق {key}: {e}")
+
+    def _read_db(self, key, default, delete):
+        """قراءة قيمة من القاعدة (وحذفها اختيارياً) في خيط الكتابة"""
+        now = time.time()
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM pending WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            if delete or row[1] <= now:
+                self._db.execute("DELETE FROM pending WHERE key = ?", (key,))
+                self._db.commit()
+                self._db_size = max(self._db_size - 1, 0)
+            if row[1] <= now:
+                self.expirations += 1
+                return default
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            logger.error(f"❌ تعذر قراءة الطلب المعلق {key}: {e}")
+            return default
+
+    def _purge_memory(self, now):
+        """حذف المنتهية صلاحيتها ثم الأقدم عند تجاوز الحد"""
+        while self._entries:
+            oldest_key, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[oldest_key]
+            self.expirations += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _purge_db(self, now):
+        """حذف المنتهية صلاحيتها ثم الأقدم عند تجاوز الحد"""
+        cursor = self._db.execute("DELETE FROM pending WHERE expires_at <= ?", (now,))
+        self.expirations += max(cursor.rowcount, 0)
+        self._db_size = self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+        overflow = self._db_size - self.max_size
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM pending WHERE key IN "
+                "(SELECT key FROM pending ORDER BY created_at LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+            self._db_size = self.max_size
+
+    def __len__(self):
+        """عدد القيم (للقاعدة المشتركة: آخر عدد محسوب عند التنظيف مع إضافات هذه العملية)"""
+        if self._db is not None:
+            return self._db_size
+        with self._lock:
+            return len(self._entries)
+
+    def metrics(self) -> Dict[str, Any]:
+        """مقاييس المخزن"""
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'backend': 'sqlite' if self._db is not None else 'memory',
+        }
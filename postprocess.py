@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import subprocess
+
+from worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# عدد عمليات FFmpeg المتزامنة (عدد الأنوية افتراضياً)
+DEFAULT_POSTPROCESS_WORKERS = int(os.getenv('POSTPROCESS_WORKERS', str(os.cpu_count() or 1)))
+FFMPEG_BINARY = os.getenv('FFMPEG_PATH', 'ffmpeg')
+FFPROBE_BINARY = os.getenv('FFPROBE_PATH', 'ffprobe')
+
+# إعدادات تحويل الصوت
+AUDIO_CODEC = 'mp3'
+AUDIO_BITRATE = '192k'
+
+# copy: نسخ الصوت دون إعادة ترميز إن كان تلقرام يدعمه، mp3: التحويل دائماً
+AUDIO_MODE = os.getenv('AUDIO_MODE', 'copy')
+
+# الترميزات التي يقبلها sendAudio وحاوية كل منها
+COPY_CONTAINERS = {
+    'mp3': 'mp3',
+    'aac': 'm4a',
+}
+
+
+class PostProcessError(Exception):
+    """فشل FFmpeg في معالجة الملف"""
+
+
+def _run_ffmpeg(args):
+    """تشغيل FFmpeg وإظهار رسالة الخطأ عند الفشل"""
+    result = subprocess.run(
+        [FFMPEG_BINARY, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y', *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise PostProcessError(result.stderr.decode('utf-8', 'replace').strip()[-500:])
+
+
+def probe_audio_codec(input_path: str):
+    """ترميز أول مسار صوتي في الملف عبر ffprobe"""
+    result = subprocess.run(
+        [FFPROBE_BINARY, '-v', 'error', '-select_streams', 'a:0',
+         '-show_entries', 'stream=codec_name', '-of', 'default=nw=1:nk=1', input_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    codec = result.stdout.decode('utf-8', 'replace').strip()
+    return codec or None
+
+
+def remux_audio(input_path: str, container: str) -> str:
+    """نقل المسار الصوتي إلى حاوية مناسبة بنسخ البيانات دون إعادة ترميز"""
+    base, ext = os.path.splitext(input_path)
+    if ext.lower() == f'.{container}':
+        return input_path
+
+    output_path = f"{base}.{container}"
+    _run_ffmpeg(['-i', input_path, '-vn', '-map', '0:a:0', '-c:a', 'copy', output_path])
+    os.remove(input_path)
+    return output_path
+
+
+def prepare_audio(input_path: str) -> str:
+    """تجهيز الملف الصوتي: نسخ سريع إن أمكن وإلا تحويل إلى MP3 (يعمل داخل مجمع FFmpeg)"""
+    if AUDIO_MODE == 'copy':
+        container = COPY_CONTAINERS.get(probe_audio_codec(input_path))
+        if container:
+            return remux_audio(input_path, container)
+    return transcode_audio(input_path)
+
+
+def transcode_audio(input_path: str) -> str:
+    """تحويل الصوت إلى MP3 وحذف الملف الأصلي (يعمل داخل مجمع FFmpeg)"""
+    base, ext = os.path.splitext(input_path)
+    if ext.lower() == f'.{AUDIO_CODEC}':
+        return input_path
+
+    output_path = f"{base}.{AUDIO_CODEC}"
+    _run_ffmpeg(['-i', input_path, '-vn', '-c:a', 'libmp3lame', '-b:a', AUDIO_BITRATE, output_path])
+    os.remove(input_path)
+    return output_path
+
+
+# مجمع خيوط منفصل بطابوره الخاص: كل خيط ينتظر عملية FFmpeg فقط، فالعمل الفعلي في عمليات FFmpeg
+# ولا حاجة لنسخ عملية البوت متعددة الخيوط بمجمع عمليات
+postprocess_pool = WorkerPool(max_workers=DEFAULT_POSTPROCESS_WORKERS, kind='thread', name='ffmpeg')
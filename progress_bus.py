@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import asyncio
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# إعدادات تحديث رسائل التقدم
+DEFAULT_MIN_INTERVAL = float(os.getenv('PROGRESS_MIN_INTERVAL', '2'))
+DEFAULT_MAX_INTERVAL = float(os.getenv('PROGRESS_MAX_INTERVAL', '15'))
+DEFAULT_EDITS_PER_SECOND = float(os.getenv('PROGRESS_EDITS_PER_SECOND', '10'))
+
+
+class ProgressBus:
+    """ناقل تقدم آمن بين الخيوط يدمج التحديثات لكل رسالة"""
+
+    def __init__(self, send, render=None, min_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, edits_per_second: Optional[float] = None):
+        self._send = send
+        self._render = render or str
+        self.min_interval = min_interval or DEFAULT_MIN_INTERVAL
+        self.max_interval = max_interval or DEFAULT_MAX_INTERVAL
+        self.edits_per_second = edits_per_second or DEFAULT_EDITS_PER_SECOND
+
+        self._loop = None
+        self._latest: Dict[Any, Any] = {}
+        self._last_text: Dict[Any, str] = {}
+        self._tasks: Dict[Any, asyncio.Task] = {}
+        self.published = 0
+        self.merged = 0
+        self.sent = 0
+
+    def bind(self, loop):
+        """ربط الناقل بحلقة الأحداث التي تُرسل منها التحديثات"""
+        self._loop = loop
+
+    def publish(self, key, state):
+        """نشر حالة جديدة من أي خيط"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._update(key, state)
+        else:
+            loop.call_soon_threadsafe(self._update, key, state)
+
+    def _update(self, key, state):
+        """حفظ أحدث حالة وتشغيل مرسل الرسالة إن لم يكن يعمل"""
+        self.published += 1
+        if key in self._latest:
+            self.merged += 1
+        self._latest[key] = state
+        if key not in self._tasks:
+            self._tasks[key] = self._loop.create_task(self._flush_loop(key))
+
+    def interval(self) -> float:
+        """الفاصل الزمني بين التحديثات حسب عدد الرسائل النشطة"""
+        adaptive = len(self._tasks) / self.edits_per_second
+        return min(max(adaptive, self.min_interval), self.max_interval)
+
+    async def _flush_loop(self, key):
+        """إرسال أحدث حالة فقط ثم الانتظار حتى التحديث التالي"""
+        try:
+            while True:
+                state = self._latest.pop(key, None)
+                if state is None:
+                    break
+                text = self._render(state)
+                if text != self._last_text.get(key):
+                    try:
+                        await self._send(key, text, state)
+                        self.sent += 1
+                    except Exception as e:
+                        logger.error(f"خطأ في إرسال التقدم: {e}")
+                    self._last_text[key] = text
+                await asyncio.sleep(self.interval())
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+
+    def close(self, key):
+        """إنهاء تتبع رسالة وحذف حالتها"""
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+        self._latest.pop(key, None)
+        self._last_text.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات الناقل"""
+        return {
+            'active': len(self._tasks),
+            'published': self.published,
+            'merged': self.merged,
+            'sent': self.sent,
+            'interval': self.interval(),
+        }
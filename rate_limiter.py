@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Optional, Dict, Any
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# حدود Bot API الافتراضية (رسالة في الثانية)
+DEFAULT_GLOBAL_RATE = float(os.getenv('TG_GLOBAL_RATE', '30'))
+DEFAULT_CHAT_RATE = float(os.getenv('TG_CHAT_RATE', '1'))
+DEFAULT_GROUP_RATE = float(os.getenv('TG_GROUP_RATE', str(20 / 60)))
+DEFAULT_MAX_RETRIES = int(os.getenv('TG_MAX_RETRIES', '3'))
+
+# أولويات الطلبات (الأصغر أولاً)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# الرفع والنتائج النهائية تسبق تحديثات التقدم الشكلية
+ENDPOINT_PRIORITIES = {
+    'sendVideo': PRIORITY_HIGH,
+    'sendAudio': PRIORITY_HIGH,
+    'sendDocument': PRIORITY_HIGH,
+    'sendMediaGroup': PRIORITY_HIGH,
+    'sendMessage': PRIORITY_HIGH,
+    'editMessageText': PRIORITY_NORMAL,
+    'sendChatAction': PRIORITY_LOW,
+}
+
+
+class TokenBucket:
+    """دلو رموز بسيط لتحديد المعدل"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """الوقت المتبقي حتى توفر رمز واحد"""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def consume(self):
+        """استهلاك رمز واحد"""
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        """إيقاف الدلو بعد خطأ flood wait"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self, now: float) -> bool:
+        """هل الدلو ممتلئ وغير محظور"""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class OutboundRateLimiter(BaseRateLimiter):
+    """مُجدول الطلبات الصادرة إلى Bot API بحدود عامة ولكل محادثة مع أولويات"""
+
+    def __init__(self, global_rate: Optional[float] = None, chat_rate: Optional[float] = None,
+                 group_rate: Optional[float] = None, max_retries: Optional[int] = None):
+        self.global_rate = global_rate or DEFAULT_GLOBAL_RATE
+        self.chat_rate = chat_rate or DEFAULT_CHAT_RATE
+        self.group_rate = group_rate or DEFAULT_GROUP_RATE
+        self.max_retries = max_retries if max_retries is not None else DEFAULT_MAX_RETRIES
+
+        self._global = TokenBucket(self.global_rate, capacity=self.global_rate)
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._waiting = []
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+        self.granted = 0
+        self.flood_waits = 0
+
+    async def initialize(self) -> None:
+        """تشغيل المُجدول"""
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def shutdown(self) -> None:
+        """إيقاف المُجدول"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        """دلو المحادثة (المجموعات أبطأ من المحادثات الخاصة)"""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0)
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, capacity=max(1.0, rate * 3))
+        return bucket
+
+    async def _acquire(self, chat_id, priority):
+        """انتظار دور الطلب حسب أولويته وحدود المحادثة"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._counter), chat_id, future))
+        self._wakeup.set()
+        await future
+
+    async def _dispatch_loop(self):
+        """منح الإذن لأعلى طلب أولوية جاهز للإرسال"""
+        while True:
+            self._waiting = [entry for entry in self._waiting if not entry[3].done()]
+            heapq.heapify(self._waiting)
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            wait = self._global.delay(now)
+            if wait <= 0:
+                wait = None
+                for entry in sorted(self._waiting):
+                    chat_wait = self._chat_bucket(entry[2]).delay(now)
+                    if chat_wait <= 0:
+                        self._waiting.remove(entry)
+                        self._global.consume()
+                        self._chat_bucket(entry[2]).consume()
+                        entry[3].set_result(True)
+                        self.granted += 1
+                        wait = 0
+                        break
+                    wait = chat_wait if wait is None else min(wait, chat_wait)
+                else:
+                    self._collect_idle(now)
+                if not wait:
+                    continue
+
+            # الانتظار حتى يتوفر رمز أو يصل طلب جديد
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _collect_idle(self, now):
+        """حذف دلاء المحادثات الخاملة لمنع نمو الذاكرة"""
+        busy = {entry[2] for entry in self._waiting}
+        for chat_id in [c for c, b in self._chats.items() if c not in busy and b.idle(now)]:
+            del self._chats[chat_id]
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        """تمرير الطلب عبر حدود المعدل مع احترام retry_after"""
+        chat_id = data.get('chat_id')
+        if chat_id is None or self._dispatcher is None:
+            return await callback(*args, **kwargs)
+
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+
+        priority = rate_limit_args if isinstance(rate_limit_args, int) \
+            else ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_NORMAL)
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.flood_waits += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"⏳ حد الطلبات في {endpoint}، إعادة المحاولة بعد {e.retry_after} ثانية")
+                self._chat_bucket(chat_id).block(e.retry_after + 0.1)
+                self._wakeup.set()
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات المُجدول"""
+        return {
+            'waiting': len([entry for entry in self._waiting if not entry[3].done()]),
+            'chats': len(self._chats),
+            'granted': self.granted,
+            'flood_waits': self.flood_waits,
+        }
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import asyncio
+from collections import deque
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# إعدادات الجدولة الافتراضية
+DEFAULT_MAX_CONCURRENT = int(os.getenv('SCHEDULER_MAX_CONCURRENT', '4'))
+DEFAULT_PER_USER_LIMIT = int(os.getenv('SCHEDULER_PER_USER_LIMIT', '1'))
+DEFAULT_MAX_QUEUE = int(os.getenv('SCHEDULER_MAX_QUEUE', '50'))
+DEFAULT_PER_USER_QUEUE = int(os.getenv('SCHEDULER_PER_USER_QUEUE', '3'))
+
+
+class QueueFullError(Exception):
+    """قائمة الانتظار ممتلئة"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"قائمة الانتظار ممتلئة ({reason})")
+        self.reason = reason
+
+
+class _Job:
+    """مهمة في قائمة الانتظار"""
+
+    __slots__ = ('user_id', 'factory', 'future', 'on_position', 'position', 'running_limit', 'notification')
+
+    def __init__(self, user_id, factory, future, on_position, running_limit=None):
+        self.user_id = user_id
+        self.factory = factory
+        self.future = future
+        self.on_position = on_position
+        self.position = None
+        self.running_limit = running_limit
+        self.notification = None
+
+
+class FairScheduler:
+    """جدولة عادلة للتحميلات بين المستخدمين مع التحكم في القبول"""
+
+    def __init__(self, max_concurrent: Optional[int] = None, per_user_limit: Optional[int] = None,
+                 max_queue: Optional[int] = None, per_user_queue: Optional[int] = None):
+        self.max_concurrent = max_concurrent or DEFAULT_MAX_CONCURRENT
+        self.per_user_limit = per_user_limit or DEFAULT_PER_USER_LIMIT
+        self.max_queue = max_queue or DEFAULT_MAX_QUEUE
+        self.per_user_queue = per_user_queue or DEFAULT_PER_USER_QUEUE
+
+        self._queues: Dict[Any, deque] = {}
+        self._rotation = deque()
+        self._running: Dict[Any, int] = {}
+        self._queued = 0
+        self._active = 0
+        self._rejected = 0
+        self._completed = 0
+
+    async def submit(self, user_id, factory, on_position=None, running_limit=None, queue_limit=None):
+        """إضافة مهمة للجدولة وانتظار نتيجتها (يمكن رفع حدود المستخدم لمهام الدفعات)"""
+        user_queue = self._queues.get(user_id)
+        if self._queued >= self.max_queue:
+            self._rejected += 1
+            raise QueueFullError('global')
+        if user_queue is not None and len(user_queue) >= max(self.per_user_queue, queue_limit or 0):
+            self._rejected += 1
+            raise QueueFullError('user')
+
+        job = _Job(user_id, factory, asyncio.get_running_loop().create_future(), on_position, running_limit)
+        if user_queue is None:
+            user_queue = self._queues[user_id] = deque()
+            self._rotation.append(user_id)
+        user_queue.append(job)
+        self._queued += 1
+
+        self._dispatch()
+        self._notify_positions()
+
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            self._discard(job)
+            raise
+
+    def _discard(self, job):
+        """إزالة مهمة ملغاة من قائمة الانتظار"""
+        user_queue = self._queues.get(job.user_id)
+        if user_queue and job in user_queue:
+            user_queue.remove(job)
+            self._queued -= 1
+            if not user_queue:
+                self._drop_user(job.user_id)
+            if job.notification is not None:
+                job.notification.cancel()
+            self._notify_positions()
+
+    def _drop_user(self, user_id):
+        """حذف مستخدم لم يعد لديه مهام منتظرة"""
+        self._queues.pop(user_id, None)
+        try:
+            self._rotation.remove(user_id)
+        except ValueError:
+            pass
+
+    def _next_job(self):
+        """اختيار المهمة التالية بالتناوب بين المستخدمين"""
+        for _ in range(len(self._rotation)):
+            user_id = self._rotation[0]
+            self._rotation.rotate(-1)
+            user_queue = self._queues[user_id]
+            # الحد الخاص بالمهمة التالية (مهام الدفعة) يترك مكاناً واحداً على الأقل لبقية المستخدمين
+            running_limit = min(user_queue[0].running_limit or 0, self.max_concurrent - 1)
+            limit = max(self.per_user_limit, running_limit)
+            if self._running.get(user_id, 0) >= limit:
+                continue
+            job = user_queue.popleft()
+            self._queued -= 1
+            if not user_queue:
+                self._drop_user(user_id)
+            return job
+        return None
+
+    def _dispatch(self):
+        """تشغيل المهام المنتظرة ضمن حدود التزامن"""
+        while self._active < self.max_concurrent:
+            job = self._next_job()
+            if job is None:
+                break
+            self._active += 1
+            self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+            asyncio.create_task(self._run(job))
+
+    async def _run(self, job):
+        """تنفيذ مهمة وتحرير مكانها عند الانتهاء"""
+        try:
+            await self._settle_notification(job)
+            result = await job.factory()
+            if not job.future.done():
+                job.future.set_result(result)
+        except asyncio.CancelledError:
+            # إلغاء المهمة (مثل إيقاف البوت) يُبلغ للمنتظر بدلاً من بقائه معلقاً
+            if not job.future.done():
+                job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._active -= 1
+            self._completed += 1
+            self._running[job.user_id] -= 1
+            if not self._running[job.user_id]:
+                del self._running[job.user_id]
+            self._dispatch()
+            self._notify_positions()
+
+    def _waiting_order(self):
+        """ترتيب المهام المنتظرة كما ستُنفذ بالتناوب"""
+        queues = [list(self._queues[user_id]) for user_id in self._rotation]
+        order = []
+        depth = 0
+        while True:
+            row = [q[depth] for q in queues if depth < len(q)]
+            if not row:
+                return order
+            order.extend(row)
+            depth += 1
+
+    def _notify_positions(self):
+        """إبلاغ المستخدمين بترتيبهم عند تغيره"""
+        for position, job in enumerate(self._waiting_order(), start=1):
+            if job.on_position is None or job.position == position:
+                continue
+            job.position = position
+            # الترتيب الجديد يلغي إشعاراً سابقاً لم يُرسل بعد
+            if job.notification is not None:
+                job.notification.cancel()
+            job.notification = asyncio.create_task(self._safe_notify(job, position))
+
+    @staticmethod
+    async def _settle_notification(job):
+        """إنهاء إشعار الترتيب المعلق قبل بدء المهمة حتى لا يصل بعد رسائل التحميل"""
+        notification, job.notification = job.notification, None
+        if notification is None or notification.done():
+            return
+        notification.cancel()
+        await asyncio.wait([notification])
+
+    async def _safe_notify(self, job, position):
+        """استدعاء آمن لمعالج الترتيب"""
+        try:
+            await job.on_position(position)
+        except Exception as e:
+            logger.error(f"خطأ في إرسال ترتيب الانتظار: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات الجدولة"""
+        return {
+            'active': self._active,
+            'queued': self._queued,
+            'users_waiting': len(self._rotation),
+            'rejected': self._rejected,
+            'completed': self._completed,
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+        }
+
+
+# الجدولة المشتركة للتحميلات
+download_scheduler = FairScheduler()
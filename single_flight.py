@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """عملية جارية مشتركة بين عدة طلبات متطابقة"""
+
+    def __init__(self, key, owner=None):
+        self.key = key
+        self.owner = owner
+        self.task = None
+        self.waiters = 0
+        self.subscribers = []
+        self.shared = {}
+        self.lock = asyncio.Lock()
+
+    @property
+    def result(self):
+        """نتيجة العملية بعد انتهائها"""
+        return self.task.result()
+
+
+class SingleFlight:
+    """دمج الطلبات المتطابقة المتزامنة في عملية واحدة"""
+
+    def __init__(self):
+        self._flights: Dict[Any, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def _start(self, key, factory, owner) -> Flight:
+        """بدء عملية جديدة بطلب صاحبها"""
+        flight = self._flights[key] = Flight(key, owner)
+        flight.task = asyncio.ensure_future(factory(flight))
+        self.started += 1
+        return flight
+
+    @staticmethod
+    def _enter(flight: Flight, subscriber):
+        """تسجيل منتظر في العملية"""
+        flight.waiters += 1
+        if subscriber is not None:
+            flight.subscribers.append(subscriber)
+
+    def _leave(self, flight: Flight, subscriber, cleanup):
+        """مغادرة منتظر وتنظيف العملية بعد آخر منتظر"""
+        flight.waiters -= 1
+        if subscriber is not None and subscriber in flight.subscribers:
+            flight.subscribers.remove(subscriber)
+        if flight.waiters == 0:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            if cleanup is not None:
+                if flight.task.done():
+                    self._cleanup(flight.task, cleanup)
+                else:
+                    flight.task.add_done_callback(lambda task: self._cleanup(task, cleanup))
+
+    @asynccontextmanager
+    async def join(self, key, factory, subscriber=None, cleanup=None, owner=None,
+                   owner_error: Optional[Callable[[BaseException], bool]] = None):
+        """الانضمام لعملية جارية بنفس المفتاح أو بدء عملية جديدة"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._start(key, factory, owner)
+        else:
+            self.coalesced += 1
+            logger.info(f"🔗 تم دمج طلب مع تحميل جارٍ: {key}")
+
+        self._enter(flight, subscriber)
+        try:
+            while True:
+                try:
+                    # حماية المهمة المشتركة من إلغاء أحد المنتظرين
+                    await asyncio.shield(flight.task)
+                    break
+                except Exception as e:
+                    # أخطاء owner_error تخص صاحب العملية وحده (مثل تجاوز حد طلباته) فلا تُنقل لبقية المنتظرين
+                    if owner_error is None or flight.owner == owner or not owner_error(e):
+                        raise
+                    logger.info(f"🔁 فشلت العملية المشتركة لسبب يخص صاحبها، إعادة المحاولة: {key}")
+                    # العملية الفاشلة لا تستقبل منضمين جدداً
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                    self._leave(flight, subscriber, cleanup)
+                    flight = self._flights.get(key) or self._start(key, factory, owner)
+                    self._enter(flight, subscriber)
+            yield flight
+        finally:
+            self._leave(flight, subscriber, cleanup)
+
+    @staticmethod
+    def _cleanup(task, cleanup):
+        """تنظيف نتيجة العملية بعد مغادرة آخر منتظر"""
+        if task.cancelled() or task.exception() is not None:
+            return
+        try:
+            cleanup(task.result())
+        except Exception as e:
+            logger.error(f"خطأ في تنظيف العملية المشتركة: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات الدمج"""
+        return {
+            'in_flight': len(self._flights),
+            'waiters': sum(f.waiters for f in self._flights.values()),
+            'started': self.started,
+            'coalesced': self.coalesced,
+        }
+
+
+# عمليات التحميل المشتركة
+download_flights = SingleFlight()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Callable
+
+logger = logging.getLogger(__name__)
+
+# عدد القياسات الأخيرة المحفوظة لكل مرحلة لحساب المئينات
+DEFAULT_MAX_SAMPLES = int(os.getenv('STAGE_TIMING_SAMPLES', '1000'))
+
+
+def percentile(values, q: float) -> float:
+    """مئين بطريقة أقرب رتبة"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(min(rank, len(ordered))) - 1]
+
+
+class StageTimings:
+    """تجميع أزمنة مراحل خط التحميل (تحميل، معالجة، رفع)"""
+
+    def __init__(self, max_samples: Optional[int] = None):
+        self.max_samples = max_samples or DEFAULT_MAX_SAMPLES
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._samples: Dict[str, deque] = {}
+        self._listeners: List[Callable[[str, float], None]] = []
+
+    def add_listener(self, callback: Callable[[str, float], None]):
+        """دالة تُستدعى مع كل قياس (لتغذية المقاييس الخارجية)"""
+        self._listeners.append(callback)
+
+    def record(self, stage: str, seconds: float):
+        """تسجيل زمن تنفيذ مرحلة"""
+        with self._lock:
+            entry = self._stages.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['last'] = seconds
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+        for callback in self._listeners:
+            try:
+                callback(stage, seconds)
+            except Exception as e:
+                logger.error(f"❌ خطأ في مستمع أزمنة المراحل: {e}")
+
+    @contextmanager
+    def measure(self, stage: str):
+        """قياس زمن كتلة كود وتسجيله"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def samples(self, stage: str) -> List[float]:
+        """القياسات الأخيرة لمرحلة"""
+        with self._lock:
+            return list(self._samples.get(stage, ()))
+
+    def percentile(self, stage: str, q: float) -> float:
+        """المئين q (بين 0 و100) من القياسات الأخيرة"""
+        return percentile(self.samples(stage), q)
+
+    def reset(self):
+        """مسح جميع القياسات"""
+        with self._lock:
+            self._stages.clear()
+            self._samples.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """متوسط وأقصى زمن لكل مرحلة"""
+        with self._lock:
+            return {
+                stage: {
+                    'count': int(entry['count']),
+                    'avg': round(entry['total'] / entry['count'], 3) if entry['count'] else 0.0,
+                    'max': round(entry['max'], 3),
+                    'last': round(entry['last'], 3),
+                    'p50': round(percentile(self._samples[stage], 50), 3),
+                    'p95': round(percentile(self._samples[stage], 95), 3),
+                }
+                for stage, entry in self._stages.items()
+            }
+
+
+# أزمنة المراحل المشتركة
+stage_timings = StageTimings()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# تحميل yt-dlp ومستخرجاته في الخلفية بعد بدء استقبال التحديثات
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', '1') != '0'
+
+# رابط نموذجي لكل منصة لتجهيز مستخرجها مسبقاً (تجميع التعابير النمطية وتحميل الوحدة)
+WARMUP_URLS = (
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://www.tiktok.com/@user/video/1234567890123456789',
+    'https://www.instagram.com/p/ABCDEFGHIJK/',
+    'https://www.facebook.com/watch/?v=1234567890',
+    'https://twitter.com/user/status/1234567890',
+    'https://soundcloud.com/user/track',
+    'https://vimeo.com/123456789',
+)
+
+
+class StartupTimer:
+    """قياس مراحل الإقلاع منذ بدء استيراد الوحدات"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._phases: Dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        """الزمن منذ بدء الإقلاع بالثواني"""
+        return time.perf_counter() - self.started
+
+    @contextmanager
+    def phase(self, name: str):
+        """قياس مرحلة وتسجيلها في السجل"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            with self._lock:
+                self._phases[name] = seconds
+            logger.info(f"⏱️ مرحلة الإقلاع {name}: {seconds:.3f} ث (منذ البدء {self.elapsed():.3f} ث)")
+
+    def mark(self, name: str):
+        """تسجيل لحظة بلوغ مرحلة منذ بدء الإقلاع"""
+        seconds = self.elapsed()
+        with self._lock:
+            self._phases[name] = seconds
+        logger.info(f"🟢 {name} بعد {seconds:.3f} ث من بدء الإقلاع")
+
+    def stats(self) -> Dict[str, Any]:
+        """أزمنة المراحل المسجلة"""
+        with self._lock:
+            return {name: round(seconds, 3) for name, seconds in self._phases.items()}
+
+
+# مؤقت الإقلاع المشترك (يبدأ مع أول استيراد لهذه الوحدة)
+startup_timer = StartupTimer()
+
+
+def warm_up():
+    """استيراد yt-dlp وتجهيز مستخرجات المنصات المدعومة"""
+    try:
+        with startup_timer.phase('yt_dlp_import'):
+            import yt_dlp
+            yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}).close()
+
+        from metadata_cache import canonical_video_key
+        with startup_timer.phase('extractors'):
+            for url in WARMUP_URLS:
+                canonical_video_key(url)
+    except Exception as e:
+        logger.error(f"❌ خطأ في تجهيز yt-dlp: {e}")
+
+
+def _run_background(tasks):
+    """تنفيذ مهام الإقلاع بالترتيب مع تسجيل الأخطاء"""
+    for task in tasks:
+        try:
+            task()
+        except Exception as e:
+            logger.error(f"❌ خطأ في مهمة الإقلاع {getattr(task, '__name__', task)}: {e}")
+
+
+def start_warmup(*tasks) -> threading.Thread:
+    """تشغيل التجهيز والمهام الإضافية في خيط خلفي حتى لا يؤخر استقبال التحديثات"""
+    if WARMUP_ENABLED:
+        tasks = (warm_up,) + tasks
+    thread = threading.Thread(target=_run_background, args=(tasks,), name='warmup', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import atexit
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# ملف الإحصائيات وفترة الحفظ الدوري بالثواني
+DEFAULT_STATS_PATH = os.getenv('STATS_FILE', 'bot_stats.json')
+DEFAULT_FLUSH_INTERVAL = float(os.getenv('STATS_FLUSH_INTERVAL', '30'))
+
+# عدد الأيام المحفوظة في الإحصائيات اليومية
+DEFAULT_DAILY_DAYS = int(os.getenv('STATS_DAILY_DAYS', '90'))
+
+# دقة عداد المستخدمين الفريدين: 2^14 خانة (16 كيلوبايت، خطأ تقريبي 0.8%)
+SKETCH_PRECISION = 14
+
+
+class HyperLogLog:
+    """تقدير عدد العناصر الفريدة بذاكرة ثابتة"""
+
+    def __init__(self, precision: int = SKETCH_PRECISION, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError(f"حجم خانات غير صحيح: {len(self.registers)} بدلاً من {self.size}")
+
+    def add(self, item) -> bool:
+        """إضافة عنصر (يعيد True إن تغيرت الخانات)"""
+        # تجزئة ثابتة بين التشغيلات بخلاف hash() في بايثون
+        digest = hashlib.blake2b(str(item).encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'big')
+        index = value >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = value & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def count(self) -> int:
+        """العدد التقديري للعناصر الفريدة"""
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # العد الخطي أدق مع الأعداد الصغيرة
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_base64(self) -> str:
+        """الخانات بصيغة نصية للحفظ في JSON"""
+        return base64.b64encode(bytes(self.registers)).decode('ascii')
+
+    @classmethod
+    def from_base64(cls, data: str, precision: int = SKETCH_PRECISION) -> 'HyperLogLog':
+        """استعادة العداد من النص المحفوظ"""
+        return cls(precision, base64.b64decode(data))
+
+
+class BotStats:
+    """إحصائيات البوت في الذاكرة مع حفظ دوري مجمّع من خيط خلفي"""
+
+    def __init__(self, path: Optional[str] = None, flush_interval: Optional[float] = None,
+                 daily_days: Optional[int] = None):
+        self.path = path if path is not None else DEFAULT_STATS_PATH
+        self.flush_interval = flush_interval or DEFAULT_FLUSH_INTERVAL
+        self.daily_days = daily_days or DEFAULT_DAILY_DAYS
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._dirty = False
+        self.flushes = 0
+        self.started_at = time.time()
+
+        self._totals = {'total_downloads': 0, 'video_downloads': 0, 'audio_downloads': 0}
+        self._daily: Dict[str, int] = {}
+        self._users = HyperLogLog()
+        self._start_time = self.started_at
+        self._load()
+
+    def _load(self):
+        """تحميل الإحصائيات المحفوظة (مرة واحدة عند البدء)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ تعذر قراءة ملف الإحصائيات {self.path}: {e}")
+            return
+
+        for key in self._totals:
+            self._totals[key] = int(data.get(key, 0))
+        self._daily = {day: int(count) for day, count in data.get('daily_stats', {}).items()}
+        self._start_time = data.get('start_time', self._start_time)
+
+        sketch = data.get('users_sketch')
+        if sketch and data.get('sketch_precision', SKETCH_PRECISION) == SKETCH_PRECISION:
+            self._users = HyperLogLog.from_base64(sketch)
+        # قائمة المستخدمين بالصيغة القديمة تُنقل إلى العداد
+        for user_id in data.get('users', []):
+            self._users.add(user_id)
+        logger.info(f"📊 تم تحميل الإحصائيات: {self._totals['total_downloads']} تحميل")
+
+    def _touch(self):
+        """تعليم البيانات للحفظ وتشغيل خيط الحفظ عند أول تغيير"""
+        self._dirty = True
+        if self._thread is None and self.path:
+            self._thread = threading.Thread(target=self._flush_loop, name='stats-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def add_user(self, user_id):
+        """تسجيل مستخدم (دون أي عمليات على القرص)"""
+        with self._lock:
+            if self._users.add(user_id):
+                self._touch()
+
+    def add_download(self, download_type: str):
+        """تسجيل تحميل (دون أي عمليات على القرص)"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            self._totals['total_downloads'] += 1
+            key = f"{download_type}_downloads"
+            if key in self._totals:
+                self._totals[key] += 1
+            self._daily[today] = self._daily.get(today, 0) + 1
+            self._touch()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """نسخة من البيانات للحفظ (تُستدعى مع القفل)"""
+        if len(self._daily) > self.daily_days:
+            for day in sorted(self._daily)[:-self.daily_days]:
+                del self._daily[day]
+        return {
+            **self._totals,
+            'total_users': self._users.count(),
+            'start_time': self._start_time,
+            'daily_stats': dict(self._daily),
+            'sketch_precision': self._users.precision,
+            'users_sketch': self._users.to_base64(),
+        }
+
+    def flush(self) -> bool:
+        """حفظ التغييرات المتراكمة دفعة واحدة (يعيد True إن تم الحفظ)"""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return False
+            data = self._snapshot()
+            self._dirty = False
+
+        # الكتابة خارج القفل في ملف مؤقت ثم الاستبدال حتى لا يبقى الملف ناقصاً
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"❌ تعذر حفظ الإحصائيات في {self.path}: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+        self.flushes += 1
+        return True
+
+    def _flush_loop(self):
+        """حفظ دوري في الخلفية"""
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """إيقاف خيط الحفظ وحفظ ما تبقى"""
+        self._stop.set()
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """الإحصائيات الحالية"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            return {
+                **self._totals,
+                'total_users': self._users.count(),
+                'today_downloads': self._daily.get(today, 0),
+                'uptime': round(time.time() - self.started_at, 1),
+                'flushes': self.flushes,
+                'dirty': self._dirty,
+            }
+
+
+# إحصائيات البوت المشتركة
+bot_stats = BotStats()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import asyncio
+import hmac
+import secrets
+import signal
+import time
+from typing import Optional, Callable
+
+from telegram import Update
+
+from metrics import add_metrics_route
+from startup import startup_timer
+
+logger = logging.getLogger(__name__)
+
+# إعدادات وضع الويب هوك
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL') or os.getenv('RENDER_EXTERNAL_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('PORT', '8080'))
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def create_webhook_app(application, secret_token: Optional[str] = None, path: str = WEBHOOK_PATH):
+    """إنشاء تطبيق HTTP يستقبل التحديثات ويمررها إلى طابور البوت"""
+    # استيراد متأخر: aiohttp لا يلزم في وضع الاستطلاع
+    from aiohttp import web
+
+    started_at = time.time()
+    counters = {'received': 0, 'rejected': 0}
+
+    async def handle_update(request: web.Request) -> web.Response:
+        """استقبال تحديث من تلقرام"""
+        if secret_token is not None:
+            received = request.headers.get(SECRET_HEADER, '')
+            if not hmac.compare_digest(received, secret_token):
+                counters['rejected'] += 1
+                logger.warning("🚫 تم رفض طلب ويب هوك برمز سري غير صحيح")
+                return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        update = Update.de_json(data, application.bot)
+        await application.update_queue.put(update)
+        counters['received'] += 1
+        return web.Response(text='ok')
+
+    async def handle_health(request: web.Request) -> web.Response:
+        """فحص صحة الخدمة"""
+        return web.json_response({
+            'status': 'ok',
+            'uptime': round(time.time() - started_at, 1),
+            'updates_received': counters['received'],
+            'updates_rejected': counters['rejected'],
+            'update_queue': application.update_queue.qsize(),
+        })
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get('/health', handle_health)
+    add_metrics_route(app)
+    app['counters'] = counters
+    return app
+
+
+async def _wait_for_stop_signal():
+    """انتظار SIGTERM/SIGINT لإيقاف البوت بشكل منظم (كما يفعل run_polling)"""
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    handled = []
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+            handled.append(sig)
+        except (NotImplementedError, RuntimeError):
+            # ويندوز لا يدعم معالجات الإشارات في الحلقة، ويبقى Ctrl+C عبر KeyboardInterrupt
+            pass
+    try:
+        await stop_event.wait()
+        logger.info("🛑 تم استلام إشارة الإيقاف، جاري إيقاف الويب هوك...")
+    finally:
+        for sig in handled:
+            loop.remove_signal_handler(sig)
+
+
+async def run_webhook(application, url: Optional[str] = None, path: str = WEBHOOK_PATH,
+                      host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                      secret_token: Optional[str] = None, on_ready: Optional[Callable[[], None]] = None):
+    """تشغيل البوت بوضع الويب هوك مع خادم HTTP مدمج"""
+    from aiohttp import web
+
+    url = url or WEBHOOK_URL
+    if not url:
+        raise ValueError("لم يتم تحديد WEBHOOK_URL لوضع الويب هوك")
+    secret_token = secret_token or WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    runner = web.AppRunner(create_webhook_app(application, secret_token, path))
+
+    try:
+        async with application:
+            await application.start()
+            await runner.setup()
+            site = web.TCPSite(runner, host, port)
+            await site.start()
+            logger.info(f"🌐 خادم الويب هوك يعمل على {host}:{port}{path}")
+
+            await application.bot.set_webhook(
+                url=url.rstrip('/') + path,
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True
+            )
+            logger.info("✅ تم تسجيل الويب هوك لدى تلقرام")
+            startup_timer.mark('جاهز لاستقبال التحديثات')
+            if on_ready is not None:
+                on_ready()
+
+            try:
+                await _wait_for_stop_signal()
+            finally:
+                await runner.cleanup()
+                await application.stop()
+    finally:
+        # PTB يستدعي post_shutdown من run_polling فقط، فيُستدعى هنا لإغلاق الموارد المشتركة
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)
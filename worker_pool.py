@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# الإعدادات الافتراضية لمجمع العمال
+DEFAULT_MAX_WORKERS = int(os.getenv('WORKER_POOL_SIZE', '8'))
+DEFAULT_POOL_KIND = os.getenv('WORKER_POOL_KIND', 'thread')
+
+
+class WorkerPool:
+    """مجمع عمال محدود لتشغيل مهام yt-dlp خارج حلقة الأحداث"""
+
+    def __init__(self, max_workers: Optional[int] = None, kind: Optional[str] = None, name: str = 'worker'):
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self.kind = kind or DEFAULT_POOL_KIND
+        self.name = name
+
+        if self.kind not in ('thread', 'process'):
+            raise ValueError(f"نوع مجمع غير مدعوم: {self.kind}")
+
+        self._executor = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._completed = 0
+        self._failed = 0
+
+    def _get_executor(self):
+        """إنشاء المنفذ عند أول استخدام"""
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=self.name
+                )
+            logger.info(f"⚙️ تم تشغيل مجمع {self.name} ({self.kind}) بعدد {self.max_workers} عامل")
+        return self._executor
+
+    def _get_semaphore(self):
+        """إنشاء محدد التزامن داخل حلقة الأحداث الحالية"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    async def run(self, func, *args):
+        """تشغيل دالة متزامنة في المجمع وانتظار نتيجتها"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore()
+
+        with self._lock:
+            self._waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        with self._lock:
+            self._active += 1
+        try:
+            result = await loop.run_in_executor(self._get_executor(), func, *args)
+            with self._lock:
+                self._completed += 1
+            return result
+        except BaseException:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات انشغال المجمع"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'kind': self.kind,
+                'max_workers': self.max_workers,
+                'active': self._active,
+                'waiting': self._waiting,
+                'completed': self._completed,
+                'failed': self._failed,
+                'utilization': self._active / self.max_workers if self.max_workers else 0.0,
+            }
+
+    def is_busy(self) -> bool:
+        """هل جميع العمال مشغولون"""
+        with self._lock:
+            return self._active >= self.max_workers
+
+    def shutdown(self, wait: bool = True):
+        """إيقاف المجمع"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            logger.info(f"🛑 تم إيقاف مجمع {self.name}")
+
+
+# المجمع المشترك لعمليات الاستخراج والتحميل
+download_pool = WorkerPool(name='ytdlp')
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# مجلد ثابت للتحميلات يُعاد استخدامه وتنظيفه بين عمليات إعادة التشغيل
+DEFAULT_ROOT = os.getenv('DOWNLOAD_DIR', os.path.join(tempfile.gettempdir(), 'bot-downloads'))
+
+# حدود المساحة
+DEFAULT_QUOTA_BYTES = int(os.getenv('WORKSPACE_QUOTA_BYTES', str(2 * 1024 ** 3)))
+DEFAULT_MIN_FREE_BYTES = int(os.getenv('WORKSPACE_MIN_FREE_BYTES', str(500 * 1024 ** 2)))
+
+# انتظار المساحة قبل رفض التحميل
+DEFAULT_WAIT_TIMEOUT = float(os.getenv('WORKSPACE_WAIT_TIMEOUT', '300'))
+WAIT_POLL_INTERVAL = 2.0
+
+# أقصى عمر للحجم المتتبع قبل تصحيحه بمسح المجلد (خارج حلقة الأحداث) بالثواني
+DEFAULT_USAGE_REFRESH = float(os.getenv('WORKSPACE_USAGE_REFRESH', '30'))
+
+# إعدادات المنظف
+DEFAULT_SWEEP_INTERVAL = float(os.getenv('WORKSPACE_SWEEP_INTERVAL', '600'))
+DEFAULT_MAX_AGE = float(os.getenv('WORKSPACE_MAX_AGE', '10800'))
+DEFAULT_PART_STALE_AGE = float(os.getenv('WORKSPACE_PART_STALE_AGE', '600'))
+
+# ملفات yt-dlp المؤقتة التي يتركها التحميل المنقطع
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp')
+
+
+class WorkspaceFullError(Exception):
+    """لا توجد مساحة كافية للتحميل"""
+
+
+class WorkspaceManager:
+    """إدارة مجلد التحميل: حصة المساحة وانتظار القرص وتنظيف الملفات المتروكة"""
+
+    def __init__(self, root: Optional[str] = None, quota_bytes: Optional[int] = None,
+                 min_free_bytes: Optional[int] = None, max_age: Optional[float] = None,
+                 part_stale_age: Optional[float] = None):
+        self.root = root or DEFAULT_ROOT
+        self.quota_bytes = quota_bytes or DEFAULT_QUOTA_BYTES
+        self.min_free_bytes = min_free_bytes if min_free_bytes is not None else DEFAULT_MIN_FREE_BYTES
+        self.max_age = max_age or DEFAULT_MAX_AGE
+        self.part_stale_age = part_stale_age or DEFAULT_PART_STALE_AGE
+        os.makedirs(self.root, exist_ok=True)
+
+        self._reserved = 0
+        # حجم المجلد متتبع في الذاكرة بدلاً من مسحه عند كل قبول (يُعدل من الحلقة ومن خيوط التنظيف)
+        self._usage = None
+        self._usage_lock = threading.Lock()
+        self._usage_at = 0.0
+        self._janitor = None
+        self.waits = 0
+        self.rejected = 0
+        self.swept_files = 0
+        self.swept_bytes = 0
+
+    def usage(self) -> int:
+        """حجم الملفات الحالية في مجلد التحميل (القيمة المتتبعة فقط، 0 قبل أول تصحيح)"""
+        return self._usage or 0
+
+    def refresh_usage(self) -> int:
+        """تصحيح الحجم المتتبع بمسح المجلد كاملاً (يُستدعى خارج حلقة الأحداث)"""
+        usage = self._tree_size(self.root)
+        with self._usage_lock:
+            self._usage = usage
+            self._usage_at = time.monotonic()
+        return usage
+
+    def _adjust_usage(self, delta: int):
+        """تعديل الحجم المتتبع بعد إضافة ملف أو حذفه"""
+        with self._usage_lock:
+            if self._usage is not None:
+                self._usage = max(0, self._usage + delta)
+
+    async def _refresh_if_stale(self):
+        """تصحيح الحجم في خيط منفصل إن مضت فترة التحديث"""
+        if self._usage is None or time.monotonic() - self._usage_at > DEFAULT_USAGE_REFRESH:
+            await asyncio.get_running_loop().run_in_executor(None, self.refresh_usage)
+
+    def free_bytes(self) -> int:
+        """المساحة الحرة في القرص"""
+        return shutil.disk_usage(self.root).free
+
+    def has_space(self, size: int = 0) -> bool:
+        """هل تكفي الحصة والقرص لملف بالحجم المتوقع"""
+        if self.usage() + self._reserved + size > self.quota_bytes:
+            return False
+        return self.free_bytes() - size >= self.min_free_bytes
+
+    @asynccontextmanager
+    async def admit(self, expected_size: Optional[int] = None, timeout: Optional[float] = None):
+        """حجز مساحة للتحميل مع الانتظار حتى تتوفر"""
+        size = expected_size or 0
+        timeout = timeout if timeout is not None else DEFAULT_WAIT_TIMEOUT
+
+        deadline = time.monotonic() + timeout
+        await self._refresh_if_stale()
+        if not self.has_space(size):
+            self.waits += 1
+            logger.warning("💾 المساحة غير كافية، انتظار انتهاء التحميلات الحالية...")
+            while not self.has_space(size):
+                if time.monotonic() >= deadline:
+                    self.rejected += 1
+                    raise WorkspaceFullError("لا توجد مساحة كافية للتحميل")
+                await asyncio.sleep(WAIT_POLL_INTERVAL)
+                await self._refresh_if_stale()
+
+        self._reserved += size
+        try:
+            yield
+        finally:
+            self._reserved -= size
+            # الملف المحمل يُحسب بحجمه المتوقع حتى التصحيح التالي (تقدير محافظ)
+            self._adjust_usage(size)
+
+    def create_job_dir(self, prefix: str = 'job_') -> str:
+        """إنشاء مجلد فريد لمهمة تحميل واحدة"""
+        return tempfile.mkdtemp(prefix=prefix, dir=self.root)
+
+    def remove(self, path: Optional[str]):
+        """حذف ملف أو مجلد مهمة داخل مجلد التحميل"""
+        if not path:
+            return
+        path = os.path.abspath(path)
+        root = os.path.abspath(self.root)
+        if path == root or os.path.commonpath([path, root]) != root:
+            logger.warning(f"⚠️ تجاهل حذف مسار خارج مجلد التحميل: {path}")
+            return
+        try:
+            if os.path.isdir(path):
+                size = self._tree_size(path)
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                size = os.path.getsize(path)
+                os.remove(path)
+            else:
+                return
+        except OSError as e:
+            logger.warning(f"⚠️ تعذر حذف {path}: {e}")
+            return
+        self._adjust_usage(-size)
+
+    def sweep(self) -> int:
+        """حذف ملفات .part المتروكة والمهام القديمة (آمن أثناء التحميل)"""
+        now = time.time()
+        removed = 0
+        freed = 0
+
+        for entry in os.scandir(self.root):
+            try:
+                age = now - entry.stat().st_mtime
+            except OSError:
+                continue
+            if age <= self.max_age:
+                continue
+            size = self._tree_size(entry.path) if entry.is_dir() else entry.stat().st_size
+            self.remove(entry.path)
+            removed += 1
+            freed += size
+
+        # ملفات التحميل المنقطع التي لم تتغير منذ مدة داخل مهام حديثة
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(PARTIAL_SUFFIXES) and '.part-Frag' not in name:
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.part_stale_age:
+                    self.remove(path)
+                    removed += 1
+                    freed += stat.st_size
+
+        # التنظيف يعمل خارج حلقة الأحداث فيصحح الحجم المتتبع أيضاً
+        self.refresh_usage()
+
+        if removed:
+            self.swept_files += removed
+            self.swept_bytes += freed
+            logger.info(f"🧹 تم تنظيف {removed} عنصر ({freed / 1024 / 1024:.1f} ميجا) من مجلد التحميل")
+        return removed
+
+    @staticmethod
+    def _tree_size(path):
+        """حجم مجلد بكل محتوياته"""
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def start_janitor(self, interval: Optional[float] = None):
+        """تشغيل التنظيف الدوري في حلقة الأحداث الحالية (مرة واحدة عند بدء التشغيل)"""
+        if self._janitor is not None and not self._janitor.done():
+            return
+        self._janitor = asyncio.get_running_loop().create_task(
+            self._janitor_loop(interval or DEFAULT_SWEEP_INTERVAL)
+        )
+
+    async def _janitor_loop(self, interval):
+        """تنظيف مجلد التحميل كل فترة"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception as e:
+                logger.error(f"❌ خطأ في تنظيف مجلد التحميل: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات مجلد التحميل"""
+        return {
+            'root': self.root,
+            'usage': self.usage(),
+            'reserved': self._reserved,
+            'quota': self.quota_bytes,
+            'free': self.free_bytes(),
+            'waits': self.waits,
+            'rejected': self.rejected,
+            'swept_files': self.swept_files,
+            'swept_bytes': self.swept_bytes,
+        }
+
+
+# مجلد التحميل المشترك
+workspace = WorkspaceManager()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# أقصى عدد نسخ خاملة لكل ملف إعدادات، وعدد الاستخدامات قبل استبدال النسخة
+DEFAULT_POOL_SIZE = int(os.getenv('YDL_POOL_SIZE', '4'))
+DEFAULT_MAX_USES = int(os.getenv('YDL_POOL_MAX_USES', '100'))
+
+
+class _Profile:
+    """نسخ YoutubeDL الخاملة لملف إعدادات واحد"""
+
+    __slots__ = ('name', 'options', 'idle')
+
+    def __init__(self, name: str, options: Dict[str, Any]):
+        self.name = name
+        self.options = options
+        self.idle = deque()
+
+
+class _Entry:
+    """نسخة YoutubeDL مع حالتها الأصلية لإعادتها بعد كل استخدام"""
+
+    __slots__ = ('ydl', 'params', 'outtmpl', 'format_selector', 'uses')
+
+    def __init__(self, ydl):
+        self.ydl = ydl
+        self.params = dict(ydl.params)
+        self.outtmpl = dict(ydl.params['outtmpl'])
+        self.format_selector = ydl.format_selector
+        self.uses = 0
+
+
+class YdlPool:
+    """مجمع نسخ YoutubeDL طويلة العمر لكل ملف إعدادات (معلومات، فيديو، صوت)"""
+
+    def __init__(self, max_size: Optional[int] = None, max_uses: Optional[int] = None):
+        self.max_size = max_size or DEFAULT_POOL_SIZE
+        self.max_uses = max_uses or DEFAULT_MAX_USES
+
+        self._profiles: Dict[Any, _Profile] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.retired = 0
+        self.discarded = 0
+
+    def _profile(self, name: str, options: Dict[str, Any]) -> _Profile:
+        """ملف الإعدادات المطابق (الإعدادات المختلفة بنفس الاسم تُعامل كملف مستقل)"""
+        key = (name, repr(options))
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None:
+                profile = self._profiles[key] = _Profile(name, options)
+            return profile
+
+    def _acquire(self, profile: _Profile) -> _Entry:
+        """نسخة خاملة أو نسخة جديدة"""
+        with self._lock:
+            if profile.idle:
+                self.reused += 1
+                return profile.idle.pop()
+
+        import yt_dlp
+
+        entry = _Entry(yt_dlp.YoutubeDL(dict(profile.options)))
+        with self._lock:
+            self.created += 1
+        logger.debug(f"🧩 نسخة YoutubeDL جديدة لملف {profile.name}")
+        return entry
+
+    @staticmethod
+    def _reset(entry: _Entry):
+        """إعادة النسخة إلى إعداداتها الأصلية وتصفير حالة التحميل السابق"""
+        ydl = entry.ydl
+        ydl.params.clear()
+        ydl.params.update(entry.params)
+        ydl.params['outtmpl'] = dict(entry.outtmpl)
+        ydl.format_selector = entry.format_selector
+        ydl._progress_hooks.clear()
+        ydl._progress_hooks.extend(entry.params.get('progress_hooks', []))
+        ydl._num_downloads = 0
+        ydl._download_retcode = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls.clear()
+        ydl._printed_messages.clear()
+
+    def _release(self, profile: _Profile, entry: _Entry, healthy: bool):
+        """إعادة النسخة للمجمع أو إغلاقها"""
+        entry.uses += 1
+        keep = healthy and entry.uses < self.max_uses
+        if keep:
+            self._reset(entry)
+            with self._lock:
+                if len(profile.idle) < self.max_size:
+                    profile.idle.append(entry)
+                    return
+                self.discarded += 1
+        else:
+            with self._lock:
+                if healthy:
+                    self.retired += 1
+                else:
+                    self.discarded += 1
+        try:
+            entry.ydl.close()
+        except Exception as e:
+            logger.warning(f"⚠️ خطأ في إغلاق نسخة YoutubeDL: {e}")
+
+    @contextmanager
+    def checkout(self, profile: str, options: Dict[str, Any], outtmpl: Optional[str] = None,
+                 format_selector: Optional[str] = None, progress_hooks=()):
+        """استعارة نسخة لملف إعدادات مع تطبيق قيم الطلب الحالي (مسار الحفظ والصيغة والتقدم)"""
+        import yt_dlp
+
+        pooled = self._profile(profile, options)
+        entry = self._acquire(pooled)
+        ydl = entry.ydl
+        healthy = True
+        try:
+            if outtmpl is not None:
+                ydl.params['outtmpl'] = {**entry.outtmpl, 'default': outtmpl}
+            if format_selector is not None:
+                ydl.params['format'] = format_selector
+                ydl.format_selector = ydl.build_format_selector(format_selector)
+            for hook in progress_hooks:
+                ydl.add_progress_hook(hook)
+            yield ydl
+        except yt_dlp.utils.DownloadError:
+            # أخطاء المحتوى (فيديو خاص أو محذوف) لا تعني تلف النسخة
+            raise
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            self._release(pooled, entry, healthy)
+
+    def clear(self):
+        """إغلاق جميع النسخ الخاملة"""
+        with self._lock:
+            entries = [entry for profile in self._profiles.values() for entry in profile.idle]
+            for profile in self._profiles.values():
+                profile.idle.clear()
+        for entry in entries:
+            try:
+                entry.ydl.close()
+            except Exception as e:
+                logger.warning(f"⚠️ خطأ في إغلاق نسخة YoutubeDL: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات المجمع"""
+        with self._lock:
+            return {
+                'profiles': len(self._profiles),
+                'idle': sum(len(profile.idle) for profile in self._profiles.values()),
+                'max_size': self.max_size,
+                'created': self.created,
+                'reused': self.reused,
+                'retired': self.retired,
+                'discarded': self.discarded,
+            }
+
+
+# مجمع YoutubeDL المشترك (لكل عملية نسختها عند استخدام مجمع عمليات)
+ydl_pool = YdlPool()